@@ -0,0 +1,589 @@
+"""Offline throughput benchmark for the ticket flow.
+
+Drives the real TicketPanel -> CategoryQuestionsModal -> language select ->
+create_ticket_channel path, the close modal / save_transcript path and
+check_inactive_tickets against an in-process fake guild, with optional API
+latency and rate limits. Each scale runs in its own process so memory figures
+are not polluted by earlier runs.
+
+    python bench.py                                   # 1k, 10k and 100k entries
+    python bench.py --scales 1000 --latency 0.05 --route-rate 5/5
+    python bench.py --scales 1000 --route-rate 5/5 --pool 50      # with a channel pool
+    python bench.py --output bench.json               # save results
+    python bench.py --compare bench.json              # fail on regressions
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, UTC
+from types import SimpleNamespace
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import discord
+import main
+
+snowflakes = itertools.count(discord.utils.time_snowflake(datetime.now(UTC)))
+
+class TokenBucket:
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Take a token, sleeping like discord.py does on a 429; returns the time waited"""
+        waited = 0.0
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) * self.per / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+class FakeDiscord:
+    """Stand-in for the REST API: per-call latency, per-route and global buckets"""
+
+    def __init__(self, latency=0.0, route_rate=None, global_rate=None):
+        self.latency = latency
+        self.route_rate = route_rate
+        self.global_bucket = TokenBucket(global_rate, 1) if global_rate else None
+        self.buckets = {}
+        self.calls = Counter()
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+
+    async def request(self, route, bucket_key=None):
+        """bucket_key mirrors Discord's per-resource buckets (per channel, per interaction token)"""
+        self.calls[route] += 1
+        waited = 0.0
+        if self.global_bucket:
+            waited += await self.global_bucket.acquire()
+        if self.route_rate:
+            key = (route, bucket_key)
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(*self.route_rate)
+            waited += await bucket.acquire()
+        if waited:
+            self.throttled += 1
+            self.throttled_seconds += waited
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+class FakeRole:
+    def __init__(self, role_id):
+        self.id = role_id
+        self.mention = f"<@&{role_id}>"
+
+class FakeUser:
+    def __init__(self, api, user_id, name, roles=(), bot=False):
+        self.api = api
+        self.id = user_id
+        self.name = name
+        self.bot = bot
+        self.roles = list(roles)
+        self.mention = f"<@{user_id}>"
+        self.avatar = SimpleNamespace(url=f"https://cdn.example.com/avatars/{user_id}.png")
+        self.display_avatar = self.avatar
+
+    async def send(self, content=None, **kwargs):
+        await self.api.request("dm", self.id)
+        read_files(kwargs)
+
+class FakeMessage:
+    def __init__(self, channel, author, content, **kwargs):
+        self.id = next(snowflakes)
+        self.channel = channel
+        self.author = author
+        self.content = content or ""
+        self.created_at = datetime.now(UTC)
+        self.components = [kwargs["view"]] if kwargs.get("view") else []
+        self.attachments = []
+
+    async def edit(self, **kwargs):
+        await self.channel.api.request("edit_message")
+
+class FakeChannel:
+    def __init__(self, guild, name, category_id=None, channel_id=None):
+        self.api = guild.api
+        self.guild = guild
+        self.id = channel_id or next(snowflakes)
+        self.name = name
+        self.category_id = category_id
+        self.created_at = datetime.now(UTC)
+        self.mention = f"<#{self.id}>"
+        self.messages = []
+        self.last_message_id = None
+
+    def inject(self, author, content):
+        """Deliver a user message as the gateway would, without a REST call"""
+        message = FakeMessage(self, author, content)
+        self.messages.append(message)
+        self.last_message_id = message.id
+        return message
+
+    async def send(self, content=None, **kwargs):
+        await self.api.request("send_message", self.id)
+        read_files(kwargs)
+        message = self.inject(self.guild.me, content)
+        await main.track_ticket_message(message)
+        return message
+
+    async def edit(self, **kwargs):
+        await self.api.request("edit_channel", self.id)
+        self.name = kwargs.get("name", self.name)
+
+    async def delete(self):
+        await self.api.request("delete_channel", self.id)
+        self.guild.channels.pop(self.id, None)
+        await main.on_guild_channel_delete(self)
+
+    async def history(self, limit=100, before=None, after=None, oldest_first=None):
+        messages = self.messages if oldest_first else list(reversed(self.messages))
+        if after is not None:
+            messages = [m for m in messages if m.id > after.id]
+        if limit is not None:
+            messages = messages[:limit]
+        for index, message in enumerate(messages):
+            if index % 100 == 0:
+                await self.api.request("history", self.id)
+            yield message
+        if not messages:
+            await self.api.request("history", self.id)
+
+class FakeGuild:
+    def __init__(self, api):
+        self.api = api
+        self.id = main.GUILD_ID
+        self.default_role = FakeRole(self.id)
+        self.icon = SimpleNamespace(url="https://cdn.example.com/icons/guild.png")
+        self.filesize_limit = discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+        self.roles = {role_id: FakeRole(role_id) for role_id in (
+            main.CLAIM_ROLE_ID, main.PRE_STAFF_ROLE_ID, main.UNVERIFIED_ROLE_ID, *main.SUPPORT_ROLES.values()
+        )}
+        self.categories = [SimpleNamespace(id=category_id) for category_id in main.TICKET_CATEGORY_IDS]
+        self.channels = {}
+        self.members = {}
+        self.me = self.add_member("Ticket Bot", bot=True)
+        self.transcripts = FakeChannel(self, "transcripts", channel_id=main.TRANSCRIPT_CHANNEL_ID)
+        self.channels[self.transcripts.id] = self.transcripts
+
+    def add_member(self, name, staff=False, bot=False):
+        roles = [self.roles[main.CLAIM_ROLE_ID]] if staff else []
+        member = FakeUser(self.api, next(snowflakes), name, roles, bot)
+        self.members[member.id] = member
+        return member
+
+    @property
+    def text_channels(self):
+        return [channel for channel in self.channels.values() if channel.category_id is not None]
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    async def create_text_channel(self, name, category=None, overwrites=None):
+        await self.api.request("create_channel")
+        channel = FakeChannel(self, name, category.id if category else None)
+        self.channels[channel.id] = channel
+        return channel
+
+class FakeResponse:
+    def __init__(self):
+        self.modal = None
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def send_modal(self, modal):
+        self.modal = modal
+        self.done = True
+
+    async def defer(self, **kwargs):
+        self.done = True
+
+    async def edit_message(self, **kwargs):
+        self.done = True
+
+    async def send_message(self, content=None, **kwargs):
+        self.done = True
+
+class FakeFollowup:
+    def __init__(self, api):
+        self.api = api
+        self.views = []
+
+    async def send(self, content=None, **kwargs):
+        await self.api.request("followup", id(self))
+        if kwargs.get("view"):
+            self.views.append(kwargs["view"])
+        return FakeFollowupMessage(self)
+
+class FakeFollowupMessage:
+    def __init__(self, followup):
+        self.followup = followup
+
+    async def edit(self, **kwargs):
+        await self.followup.api.request("followup_edit", id(self.followup))
+
+class FakeInteraction:
+    def __init__(self, guild, user, channel=None):
+        self.id = next(snowflakes)
+        self.guild = guild
+        self.user = user
+        self.channel = channel
+        self.message = None
+        self.response = FakeResponse()
+        self.followup = FakeFollowup(guild.api)
+
+    async def edit_original_response(self, **kwargs):
+        await self.guild.api.request("edit_original_response", self.id)
+        if kwargs.get("view"):
+            self.followup.views.append(kwargs["view"])
+
+def read_files(kwargs):
+    for file in kwargs.get("files") or ([kwargs["file"]] if kwargs.get("file") else []):
+        file.fp.read()
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def summarize(latencies, elapsed):
+    return {
+        "count": len(latencies),
+        "per_second": len(latencies) / elapsed if elapsed else None,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+    }
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def seed_ticket_log(entries):
+    """Write a ticket log of the given size in the on-disk format"""
+    categories = list(main.TICKET_CATEGORIES)
+    closed_at = datetime.now(UTC)
+    with open(main.TICKET_LOG_FILE, "w", encoding="utf-8") as f:
+        for index in range(entries):
+            category = categories[index % len(categories)]
+            opened_at = closed_at - timedelta(hours=index % 48 + 1)
+            entry = main.TicketRecord(
+                index,
+                user_id=index,
+                language="en" if index % 2 else "it",
+                category=category,
+                unique_id=base36(index).rjust(5, "0")
+            ).to_log_entry(
+                f"{main.get_ticket_prefix(category)}{index // len(categories) + 1}",
+                opened_at=opened_at.isoformat(),
+                closed_at=closed_at.isoformat(),
+                duration=str(closed_at - opened_at).split(".")[0],
+                staff_messages=index % 7,
+                closer=index
+            )
+            f.write(main.encode_log_entry(entry) + "\n")
+
+def base36(number):
+    digits = string.digits + string.ascii_uppercase
+    encoded = ""
+    while True:
+        number, remainder = divmod(number, 36)
+        encoded = digits[remainder] + encoded
+        if not number:
+            return encoded
+
+async def open_ticket(guild, user, category, lang, double_submit=False):
+    """Panel select -> questions modal -> language select, as a user would click through
+
+    With double_submit the language select and the form interaction are each
+    delivered twice at once, like a laggy client double clicking and Discord retrying.
+    """
+    interaction = FakeInteraction(guild, user)
+    panel = main.TicketPanel()
+    panel.ticket_select._values = [category]
+    await panel.ticket_select.callback(interaction)
+
+    modal = interaction.response.modal
+    for child in modal.children:
+        child._value = "Benchmark answer"
+    interaction.response = FakeResponse()
+    await modal.on_submit(interaction)
+
+    language_view = interaction.followup.views[-1]
+    language_view.select_callback._values = [lang]
+    if not double_submit:
+        await language_view.select_callback.callback(FakeInteraction(guild, user))
+        return
+    await asyncio.gather(
+        language_view.select_callback.callback(FakeInteraction(guild, user)),
+        language_view.select_callback.callback(FakeInteraction(guild, user)),
+        main.create_ticket_channel(interaction, category, "Benchmark answer", lang)
+    )
+
+async def close_ticket(guild, staff, channel):
+    """Close button -> close modal -> save_transcript and channel delete"""
+    interaction = FakeInteraction(guild, staff, channel)
+    controls = main.TicketControls(None)
+    await controls.close_button.callback(interaction)
+    modal = interaction.response.modal
+    modal.reason._value = "Benchmark close"
+    interaction.response = FakeResponse()
+    await modal.on_submit(interaction)
+
+async def timed_batch(coroutines, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def run(coroutine):
+        async with semaphore:
+            started = time.perf_counter()
+            await coroutine
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
+    return summarize(latencies, time.perf_counter() - started)
+
+async def run_scale(args):
+    entries = args.entries
+    api = FakeDiscord(args.latency, args.route_rate, args.global_rate)
+    guild = FakeGuild(api)
+    main.bot.get_channel = guild.get_channel
+    main.bot.get_user = guild.get_member
+    main.bot._connection.user = guild.me
+    # Deadlines are fixed when a ticket is first seen; a zero timeout makes every ticket still open at the end overdue
+    main.inactivity_scheduler.timeout = 0
+    results = {"entries": entries}
+    # Pace the run only when asked to, whatever the bot is configured with
+    main.TICKET_GLOBAL_RATE = args.ticket_rate
+    main.admission = main.AdmissionController()
+
+    if args.pool:
+        # Fill the pool up front, then refill at the bot's normal pace during the run
+        refill_delay, main.CHANNEL_POOL_REFILL_DELAY = main.CHANNEL_POOL_REFILL_DELAY, 0
+        main.channel_pool.size = args.pool
+        main.channel_pool.adopt(guild)
+        main.channel_pool.start()
+        while any(main.channel_pool.available(category_id) < args.pool for category_id in main.TICKET_CATEGORY_IDS):
+            await asyncio.sleep(0.01)
+        main.CHANNEL_POOL_REFILL_DELAY = refill_delay
+
+    seed_ticket_log(entries)
+    started = time.perf_counter()
+    await asyncio.to_thread(main.ticket_log_store.entries)
+    main.rebuild_ticket_counters()
+    main.load_used_ticket_ids()
+    results["log_load_ms"] = (time.perf_counter() - started) * 1000
+    await main.transcript_delivery.start()
+
+    users = [guild.add_member(f"user{i}") for i in range(args.tickets)]
+    staff = [guild.add_member(f"staff{i}", staff=True) for i in range(5)]
+    categories = list(main.TICKET_CATEGORIES)
+    results["create"] = await timed_batch(
+        (open_ticket(guild, user, random.choice(categories), random.choice(["en", "it"]), args.double_submit) for user in users),
+        args.concurrency
+    )
+    ticket_channels = [channel for channel in guild.channels.values() if main.is_ticket_channel(channel)]
+    results["duplicate_tickets"] = len(ticket_channels) - len(users)
+
+    started = time.perf_counter()
+    for channel in ticket_channels:
+        for index in range(args.messages):
+            author = staff[index % len(staff)] if index % 3 == 0 else users[index % len(users)]
+            await main.track_ticket_message(channel.inject(author, f"Benchmark message {index} " + "x" * 60))
+    elapsed = time.perf_counter() - started
+    results["ingest_messages_per_second"] = len(ticket_channels) * args.messages / elapsed if elapsed else None
+
+    large = ticket_channels[0]
+    for index in range(entries):
+        await main.track_ticket_message(large.inject(users[index % len(users)], f"Backlog message {index}"))
+    started = time.perf_counter()
+    await close_ticket(guild, staff[0], large)
+    results["close_large_ms"] = (time.perf_counter() - started) * 1000
+
+    half = len(ticket_channels) // 2
+    results["close"] = await timed_batch(
+        (close_ticket(guild, staff[i % len(staff)], channel) for i, channel in enumerate(ticket_channels[1:half])),
+        args.concurrency
+    )
+
+    remaining = len(main.inactivity_scheduler.last_activity)
+    started = time.perf_counter()
+    await main.check_inactive_tickets()
+    elapsed = time.perf_counter() - started
+    results["inactive_close"] = {
+        "count": remaining,
+        "per_second": remaining / elapsed if elapsed else None,
+        "total_ms": elapsed * 1000
+    }
+
+    started = time.perf_counter()
+    await main.transcript_delivery._queue.join()
+    results["delivery_drain_ms"] = (time.perf_counter() - started) * 1000
+    await main.bot.close()
+
+    results["api_calls"] = dict(api.calls)
+    results["throttled_calls"] = api.throttled
+    results["throttled_seconds"] = api.throttled_seconds
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+def parse_rate(value):
+    rate, per = value.split("/")
+    return int(rate), float(per)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline ticket system benchmark")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="ticket log entries (and backlog messages in the large close) per run")
+    parser.add_argument("--tickets", type=int, default=200, help="tickets opened per run")
+    parser.add_argument("--messages", type=int, default=50, help="messages posted in each ticket")
+    parser.add_argument("--concurrency", type=int, default=20, help="flows in flight at once")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API call")
+    parser.add_argument("--route-rate", type=parse_rate, default=None, metavar="N/SECONDS",
+                        help="per-route bucket, e.g. 5/5")
+    parser.add_argument("--global-rate", type=int, default=None, help="global requests per second")
+    parser.add_argument("--ticket-rate", type=parse_rate, default=None, metavar="N/SECONDS",
+                        help="admission control global rate (TICKET_GLOBAL_RATE); unlimited by default")
+    parser.add_argument("--double-submit", action="store_true", help="deliver every ticket form twice at once")
+    parser.add_argument("--pool", type=int, default=0, help="pre-created channels per category (CHANNEL_POOL_SIZE)")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON; exit 1 on regressions beyond --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--entries", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def run_in_subprocess(child_argv, entries):
+    command = [sys.executable, os.path.abspath(__file__), *child_argv, "--entries", str(entries)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def format_rate(value):
+    return f"{value:,.1f}" if value is not None else "-"
+
+def format_ms(value):
+    return f"{value:,.1f}" if value is not None else "-"
+
+def print_report(results):
+    header = f"{'entries':>8} {'load ms':>9} {'open/s':>8} {'open p50':>9} {'open p99':>9} " \
+             f"{'close/s':>8} {'close p50':>10} {'close p99':>10} {'inactive/s':>11} {'large ms':>9} {'rss MB':>7} {'dupes':>6}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        create, close = result["create"], result["close"]
+        print(
+            f"{result['entries']:>8} {format_ms(result['log_load_ms']):>9} {format_rate(create['per_second']):>8} "
+            f"{format_ms(create['p50_ms']):>9} {format_ms(create['p99_ms']):>9} {format_rate(close['per_second']):>8} "
+            f"{format_ms(close['p50_ms']):>10} {format_ms(close['p99_ms']):>10} "
+            f"{format_rate(result['inactive_close']['per_second']):>11} {format_ms(result['close_large_ms']):>9} "
+            f"{format_ms(result['peak_rss_mb']):>7} {result.get('duplicate_tickets', '-'):>6}"
+        )
+
+def compare(results, baseline, tolerance):
+    """Return human-readable regressions against a previous run"""
+    previous = {result["entries"]: result for result in baseline}
+    checks = [
+        ("open/s", lambda r: r["create"]["per_second"], True),
+        ("close/s", lambda r: r["close"]["per_second"], True),
+        ("open p99", lambda r: r["create"]["p99_ms"], False),
+        ("close p99", lambda r: r["close"]["p99_ms"], False),
+        ("log load", lambda r: r["log_load_ms"], False),
+        ("large close", lambda r: r["close_large_ms"], False),
+    ]
+    regressions = []
+    for result in results:
+        old = previous.get(result["entries"])
+        if not old:
+            continue
+        for name, metric, higher_is_better in checks:
+            new_value, old_value = metric(result), metric(old)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{result['entries']} entries: {name} {old_value:,.1f} -> {new_value:,.1f} ({change:+.0%})")
+    return regressions
+
+def main_cli(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+
+    if args.entries is not None:
+        # Child process: run one scale in a scratch directory and print JSON
+        logging.getLogger().setLevel(logging.CRITICAL)
+        directory = tempfile.mkdtemp(prefix="ticket-bench-")
+        os.chdir(directory)
+        try:
+            print(json.dumps(asyncio.run(run_scale(args))))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        return 0
+
+    child_argv = [
+        "--tickets", str(args.tickets), "--messages", str(args.messages),
+        "--concurrency", str(args.concurrency), "--latency", str(args.latency), "--pool", str(args.pool)
+    ]
+    if args.route_rate:
+        child_argv += ["--route-rate", f"{args.route_rate[0]}/{args.route_rate[1]}"]
+    if args.double_submit:
+        child_argv.append("--double-submit")
+    if args.ticket_rate:
+        child_argv += ["--ticket-rate", f"{args.ticket_rate[0]}/{args.ticket_rate[1]}"]
+    if args.global_rate:
+        child_argv += ["--global-rate", str(args.global_rate)]
+    results = []
+    for entries in args.scales:
+        print(f"Running {entries:,} entries...", file=sys.stderr)
+        results.append(run_in_subprocess(child_argv, entries))
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,8 +1,8 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord import app_commands
 from discord.ui import View, Button, Select, Modal, TextInput, Item
-from datetime import datetime, UTC
+from datetime import datetime, timedelta, UTC
 import io
 import logging
 import re
@@ -12,6 +12,25 @@ import json
 import time
 import string
 import random
+import atexit
+import threading
+import tempfile
+import gzip
+import shutil
+import math
+import heapq
+import hashlib
+import cProfile
+import pstats
+import marshal
+import sys
+import array
+import sqlite3
+import functools
+from aiohttp import web
+from collections import deque, OrderedDict, Counter
+from collections.abc import MutableMapping
+from typing import NamedTuple, Optional
 from discord.errors import HTTPException, NotFound, Forbidden, DiscordServerError
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
@@ -25,107 +44,1213 @@ UNVERIFIED_ROLE_ID = 1234567890
 USER_ROLE_ID = 1234567890
 PRE_STAFF_ROLE_ID = 1234567890
 INACTIVE_TIMEOUT = 24  # Ore
+INACTIVE_CLOSE_CONCURRENCY = 3
+RENAME_RATE_LIMIT = 2  # Rinomine per canale concesse da Discord
+RENAME_RATE_WINDOW = 600  # Secondi
+STATE_SWEEP_INTERVAL = 300  # Secondi
+MAX_OPEN_TICKETS_PER_USER = 0  # 0 = nessun limite
+MAX_OPEN_TICKETS_PER_CATEGORY = 0  # 0 = nessun limite
+TICKET_USER_RATE = None  # (ticket, secondi) per utente, es. (3, 600); None = nessun limite
+TICKET_GLOBAL_RATE = None  # (ticket, secondi) in tutto il server, es. (20, 60); oltre si entra in coda. None = nessun limite
+TICKET_QUEUE_MAX = 100
+TICKET_QUEUE_UPDATE_INTERVAL = 10  # Secondi tra due aggiornamenti della posizione in coda
+TICKET_IDEMPOTENCY_TTL = 300  # Secondi in cui un invio duplicato restituisce lo stesso ticket
+CHANNEL_POOL_SIZE = 0  # Canali nascosti pronti per ogni categoria Discord (0 = disattivato)
+CHANNEL_POOL_PREFIX = "pool-"
+CHANNEL_POOL_REFILL_DELAY = 2  # Secondi tra due creazioni in background
+MINIMAL_INTENTS = False  # True: niente presenze né cache dei membri, i membri vengono recuperati al bisogno
+USER_CACHE_SIZE = 512
+USER_CACHE_TTL = 600  # Secondi
+METRICS_ENABLED = False
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PROFILE_CHANNEL_ID = 1234567890  # Canale staff dove arrivano i report di /profile
+PROFILE_MAX_SECONDS = 600
+PROFILE_SAMPLE_INTERVAL = 0.005  # Secondi tra due campioni in modalità sampling
+PROFILE_REPORT_LINES = 30
 VOICE_CHANNEL_ID = 1234567890
 NOTIFICATION_CHANNEL_ID = 1234567890
 
-TICKET_LOG_FILE = "ticket_log.json"
+TICKET_LOG_FILE = "ticket_log.jsonl"
+LEGACY_TICKET_LOG_FILE = "ticket_log.json"
+TICKET_LOG_COMPACT_RATIO = 2
+TICKET_LOG_COMPACT_MIN_LINES = 1000
+TICKET_LOG_FLUSH_DELAY = 1.0  # Secondi
+TICKET_LOG_ARCHIVE_DIR = "ticket_log_archive"
+TICKET_LOG_ARCHIVE_GZIP = True
+TICKET_LOG_SEGMENT_CACHE = 2  # Segmenti mensili tenuti in memoria
+TICKET_LOG_STALE_DAYS = 31  # Ticket mai chiusi più vecchi di così vengono archiviati
+TRANSCRIPT_SPOOL_SIZE = 1024 * 1024  # Byte tenuti in memoria prima di passare su disco
+TRANSCRIPT_GZIP = False
+TRANSCRIPT_JOURNAL_DIR = "transcript_journal"
+TICKET_STATS_FILE = "ticket_stats.json"
+TICKET_COLUMNS_DIR = "ticket_columns"
+TRANSCRIPT_INDEX_FILE = "transcript_index.db"
+TRANSCRIPT_SEARCH_RESULTS = 10
+STARTUP_CONCURRENCY = 10
+TICKET_STATE_SNAPSHOT_FILE = "ticket_state.json"
+TICKET_STATE_WAL_FILE = "ticket_state.wal"
+TICKET_STATE_CHECKPOINT_OPS = 500
+TRANSCRIPT_QUEUE_DIR = "transcript_queue"
+TRANSCRIPT_DELIVERY_WORKERS = 3
+TRANSCRIPT_DELIVERY_MAX_ATTEMPTS = 8
+TRANSCRIPT_DELIVERY_BACKOFF = 5  # Secondi, raddoppia a ogni tentativo
+TRANSCRIPT_DELIVERY_MAX_BACKOFF = 600  # Secondi
+COMMAND_SYNC_FILE = "command_sync.json"
+SYNC_COMMANDS_TO_GUILD = False  # True per sincronizzare subito solo su GUILD_ID durante lo sviluppo
+
+class Metrics:
+    """In-process histograms, counters and gauges rendered in Prometheus text format"""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+        self._listeners = []
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted(labels.items())) if labels else ()
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        series = self._histograms.setdefault(name, {})
+        key = self._key(labels)
+        state = series.get(key)
+        if state is None:
+            state = series[key] = [[0] * len(METRICS_BUCKETS), 0.0, 0]
+        buckets, _, _ = state
+        for i, bound in enumerate(METRICS_BUCKETS):
+            if value <= bound:
+                buckets[i] += 1
+        state[1] += value
+        state[2] += 1
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        series = self._counters.setdefault(name, {})
+        key = self._key(labels)
+        series[key] = series.get(key, 0) + amount
+
+    def gauge(self, name, callback, help_text=""):
+        """Register a gauge whose value is read from callback at scrape time"""
+        self._gauges[name] = callback
+        self._help[name] = help_text
+
+    def add_listener(self, callback):
+        """Call callback(name, labels, seconds) for every timed coroutine, even with metrics disabled"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def timed(self, name, **labels):
+        """Decorator recording the coroutine's duration into a histogram"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not self.enabled and not self._listeners:
+                    return await func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    self.observe(name, elapsed, **labels)
+                    for listener in self._listeners:
+                        listener(name, labels, elapsed)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _format_labels(key, extra=None):
+        pairs = list(key) + (list(extra.items()) if extra else [])
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self):
+        lines = []
+        for name, series in sorted(self._histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for key, (buckets, total, count) in series.items():
+                for bound, bucket_count in zip(METRICS_BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{self._format_labels(key, {'le': bound})} {bucket_count}")
+                lines.append(f"{name}_bucket{self._format_labels(key, {'le': '+Inf'})} {count}")
+                lines.append(f"{name}_sum{self._format_labels(key)} {total}")
+                lines.append(f"{name}_count{self._format_labels(key)} {count}")
+        for name, series in sorted(self._counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for key, value in series.items():
+                lines.append(f"{name}{self._format_labels(key)} {value}")
+        for name, callback in sorted(self._gauges.items()):
+            try:
+                value = callback()
+            except Exception as e:
+                logger.error(f"Error reading gauge {name}: {e}")
+                continue
+            if self._help.get(name):
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics(METRICS_ENABLED)
+
+class RateLimitLogCounter(logging.Filter):
+    """Counts the 429 warnings discord.py logs while it retries rate-limited requests"""
+
+    def filter(self, record):
+        if isinstance(record.msg, str) and record.msg.startswith("We are being rate limited"):
+            metrics.inc("discord_api_ratelimited_total", method=record.args[0] if record.args else "unknown")
+        elif isinstance(record.msg, str) and record.msg.startswith("Global rate limit has been hit"):
+            metrics.inc("discord_api_global_ratelimited_total")
+        return True
+
+def instrument_http_client(client):
+    """Wrap discord.py's HTTP client so every REST call is timed per route"""
+    original_request = client.request
+
+    @functools.wraps(original_request)
+    async def timed_request(route, **kwargs):
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            return await original_request(route, **kwargs)
+        except HTTPException as e:
+            status = str(e.status)
+            raise
+        finally:
+            metrics.observe(
+                "discord_api_request_seconds", time.perf_counter() - start,
+                route=f"{route.method} {route.path}", status=status
+            )
+
+    client.request = timed_request
+
+async def start_metrics_server():
+    async def handle_metrics(request):
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, METRICS_HOST, METRICS_PORT)
+    await site.start()
+    logger.info(f"Metrics available at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return runner
+
+class StackSampler:
+    """Low-overhead profiler that samples the event loop thread's stack from a helper thread"""
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def report(self, limit):
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+        samples = max(self.samples, 1)
+        lines = [f"{self.samples} samples every {self.interval * 1000:g} ms", "", "Self time:"]
+        lines += [f"{count / samples:7.1%}  {frame}" for frame, count in own.most_common(limit)]
+        lines += ["", "Inclusive time:"]
+        lines += [f"{count / samples:7.1%}  {frame}" for frame, count in inclusive.most_common(limit)]
+        return "\n".join(lines)
+
+    def collapsed(self):
+        """Stacks in the folded format read by flamegraph.pl and speedscope"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+class ProfilingSession:
+    """One /profile run: cProfile or stack sampling plus per-coroutine timings, for N seconds or N interactions"""
+
+    def __init__(self, mode, seconds, interactions=None, origin_id=None):
+        self.mode = mode
+        self.seconds = seconds
+        self.remaining_interactions = interactions
+        self.origin_id = origin_id
+        self.interactions = 0
+        self.timings = {}
+        self.done = asyncio.Event()
+        self._profile = None
+        self._sampler = None
+        self._timer = None
+        self._started = None
+        self.elapsed = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self.mode == "sampling":
+            self._sampler = StackSampler()
+            self._sampler.start()
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._timer = asyncio.get_running_loop().call_later(self.seconds, self.finish)
+
+    def record(self, name, labels, elapsed):
+        key = labels.get("handler") or labels.get("task") or name
+        stats = self.timings.get(key)
+        if stats is None:
+            stats = self.timings[key] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+    def count_interaction(self, interaction):
+        if interaction.id == self.origin_id:
+            return
+        self.interactions += 1
+        if self.remaining_interactions is not None and self.interactions >= self.remaining_interactions:
+            self.finish()
+
+    def finish(self):
+        if self.done.is_set():
+            return
+        if self._timer:
+            self._timer.cancel()
+        if self._profile:
+            self._profile.disable()
+        if self._sampler:
+            self._sampler.stop()
+        self.elapsed = time.perf_counter() - self._started
+        self.done.set()
+
+    def report(self, limit=PROFILE_REPORT_LINES):
+        lines = [f"Profile ({self.mode}) over {self.elapsed:.1f}s, {self.interactions} interactions", ""]
+        lines.append(f"{'coroutine':<40} {'calls':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9}")
+        for key, (calls, total, longest) in sorted(self.timings.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(f"{key[:40]:<40} {calls:>7} {total:>9.3f} {total / calls * 1000:>9.1f} {longest * 1000:>9.1f}")
+        if not self.timings:
+            lines.append("(no timed coroutines ran)")
+        lines.append("")
+        if self._sampler:
+            lines.append(self._sampler.report(limit))
+        elif self._profile:
+            for sort_key in ("cumulative", "tottime"):
+                stream = io.StringIO()
+                pstats.Stats(self._profile, stream=stream).strip_dirs().sort_stats(sort_key).print_stats(limit)
+                lines.append(f"Hotspots by {sort_key}:")
+                lines.append(stream.getvalue().strip())
+                lines.append("")
+        return "\n".join(lines)
+
+    def files(self):
+        stamp = datetime.now(UTC).strftime("%Y%m%d-%H%M%S")
+        files = [discord.File(io.BytesIO(self.report().encode("utf-8")), filename=f"profile-{stamp}.txt")]
+        if self._profile:
+            stats = pstats.Stats(self._profile)
+            files.append(discord.File(io.BytesIO(marshal.dumps(stats.stats)), filename=f"profile-{stamp}.prof"))
+        elif self._sampler:
+            files.append(discord.File(io.BytesIO(self._sampler.collapsed().encode("utf-8")), filename=f"profile-{stamp}.folded"))
+        return files
+
+profiling_session = None
+
+def encode_log_entry(entry):
+    return json.dumps(entry, default=str, separators=(",", ":"))
+
+class TicketLogStore:
+    """Append-only JSON-lines ticket log with an in-memory index by channel name.
+
+    Mutations update the index immediately and are buffered until flush(), which
+    is safe to call from a worker thread.
+    """
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._entries = None
+        self._journal_lines = 0
+        self._pending = {}
+        self._needs_rewrite = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self._entries is not None:
+            return
+        with self._lock:
+            if self._entries is not None:
+                return
+            entries = {}
+            if not os.path.exists(self.path) and self.legacy_path and os.path.exists(self.legacy_path):
+                self._migrate_legacy()
+            self._journal_lines = 0
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line_number, line in enumerate(f, start=1):
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError as e:
+                            logger.warning(f"Skipping corrupt ticket log line {line_number}: {e}")
+                            continue
+                        self._index(entries, entry)
+                        self._journal_lines += 1
+            self._entries = entries
+
+    def _migrate_legacy(self):
+        """One-shot import of the old whole-file ticket_log.json"""
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                data = f.read().strip()
+                logs = json.loads(data) if data else []
+        except json.JSONDecodeError as e:
+            logger.error(f"Error migrating legacy ticket log: {e}")
+            backup_file = f"{self.legacy_path}.backup.{int(time.time())}"
+            os.rename(self.legacy_path, backup_file)
+            return
+        entries = {}
+        for entry in logs:
+            self._index(entries, entry)
+        self._write_lines([encode_log_entry(entry) for entry in entries.values()])
+        os.rename(self.legacy_path, f"{self.legacy_path}.migrated")
+        logger.info(f"Migrated {len(entries)} ticket log entries to {self.path}")
+
+    @staticmethod
+    def _index(entries, entry):
+        key = entry.get("channel_name")
+        entries.pop(key, None)
+        entries[key] = entry
+
+    def _write_lines(self, lines):
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line + "\n")
+        os.replace(temp_file, self.path)
+        self._journal_lines = len(lines)
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    def entries(self):
+        self._ensure_loaded()
+        return list(self._entries.values())
+
+    def get(self, channel_name):
+        self._ensure_loaded()
+        return self._entries.get(channel_name)
+
+    def upsert(self, entry):
+        self._ensure_loaded()
+        line = encode_log_entry(entry)
+        key = entry.get("channel_name")
+        with self._lock:
+            self._index(self._entries, json.loads(line))
+            self._pending.pop(key, None)
+            self._pending[key] = line
+
+    def remove(self, channel_names):
+        self._ensure_loaded()
+        with self._lock:
+            for channel_name in channel_names:
+                self._entries.pop(channel_name, None)
+                self._pending.pop(channel_name, None)
+            self._needs_rewrite = True
+
+    def flush(self):
+        """Write buffered mutations to disk; compacts the journal when it has grown too large"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending and not self._needs_rewrite:
+                    return
+                pending = list(self._pending.values())
+                self._pending = {}
+                rewrite = self._needs_rewrite or self._journal_lines + len(pending) > max(
+                    TICKET_LOG_COMPACT_MIN_LINES, len(self._entries) * TICKET_LOG_COMPACT_RATIO
+                )
+                self._needs_rewrite = False
+                snapshot = list(self._entries.values()) if rewrite else None
+            if rewrite:
+                self._write_lines([encode_log_entry(entry) for entry in snapshot])
+                logger.info(f"Compacted ticket log to {len(snapshot)} entries")
+            else:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(line + "\n" for line in pending))
+                self._journal_lines += len(pending)
+
+class BackgroundFlusher:
+    """Write-behind worker that flushes a buffered store off the event loop"""
+
+    def __init__(self, store, delay=TICKET_LOG_FLUSH_DELAY):
+        self.store = store
+        self.delay = delay
+        self._wakeup = None
+        self._task = None
+
+    def notify(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.store.flush()
+            return
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Wait a little so a burst of mutations is written in a single flush
+            await asyncio.sleep(self.delay)
+            try:
+                await asyncio.to_thread(self.store.flush)
+            except Exception as e:
+                logger.error(f"Error flushing {type(self.store).__name__}: {e}")
+                self._wakeup.set()
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.store.flush)
+
+ticket_log_store = TicketLogStore(TICKET_LOG_FILE, LEGACY_TICKET_LOG_FILE)
+ticket_log_writer = BackgroundFlusher(ticket_log_store)
+atexit.register(ticket_log_store.flush)
 
 def load_ticket_log():
     try:
-        if not os.path.exists(TICKET_LOG_FILE):
-            return []
-        with open(TICKET_LOG_FILE, "r", encoding="utf-8") as f:
-            data = f.read().strip()
-            return json.loads(data) if data else []
-    except (json.JSONDecodeError, FileNotFoundError) as e:
+        return ticket_log_store.entries()
+    except Exception as e:
         logger.error(f"Error loading ticket log: {e}")
-        if os.path.exists(TICKET_LOG_FILE):
-            backup_file = f"{TICKET_LOG_FILE}.backup.{int(time.time())}"
-            os.rename(TICKET_LOG_FILE, backup_file)
         return []
 
-def save_ticket_log(logs):
-    try:
-        temp_file = f"{TICKET_LOG_FILE}.tmp"
-        with open(temp_file, "w", encoding="utf-8") as f:
-            json.dump(logs, f, indent=4, default=str)
-        os.replace(temp_file, TICKET_LOG_FILE)
-    except Exception as e:
-        logger.error(f"Error saving ticket log: {e}")
-
 def append_ticket_log(entry):
     try:
-        logs = load_ticket_log()
-        logs = [log for log in logs if log.get("channel_name") != entry.get("channel_name")]
         sanitized_entry = {k: v for k, v in entry.items() if not callable(v)}
-        logs.append(sanitized_entry)
-        save_ticket_log(logs)
+        ticket_log_store.upsert(sanitized_entry)
+        ticket_log_writer.notify()
     except Exception as e:
         logger.error(f"Error appending to ticket log: {e}")
 
-def get_next_ticket_number(category_key):
-    """Get the next available ticket number for a category"""
-    try:
-        logs = load_ticket_log()
-        prefix = category_key.split()[1].lower() + "-"
-        numbers = []
-        
-        for log in logs:
-            channel_name = log.get("channel_name", "")
+def ticket_log_month(entry):
+    """Month an entry is archived under: when it closed, or opened if it never did"""
+    value = entry.get("closed_at") or entry.get("opened_at")
+    return value[:7] if value else None
+
+def ticket_number_maxima(entries):
+    """Highest ticket number used per category prefix"""
+    prefixes = [get_ticket_prefix(category) for category in TICKET_CATEGORIES]
+    maxima = {}
+    for entry in entries:
+        channel_name = entry.get("channel_name") or ""
+        for prefix in prefixes:
             if channel_name.startswith(prefix):
                 try:
                     num = int(channel_name.split("-")[-1])
-                    numbers.append(num)
                 except (ValueError, IndexError):
                     continue
-                    
-        return max(numbers, default=0) + 1
+                maxima[prefix] = max(maxima.get(prefix, 0), num)
+    return maxima
+
+class TicketLogArchive:
+    """Immutable monthly segments of closed tickets, plus a manifest.
+
+    The manifest carries each segment's entry count and highest ticket numbers,
+    and each segment has a plain list of its ticket IDs. So startup never has to
+    parse old tickets, segments are only read when a query needs them, and a
+    corrupt segment only loses that month.
+    """
+
+    def __init__(self, directory, compress=TICKET_LOG_ARCHIVE_GZIP):
+        self.directory = directory
+        self.compress = compress
+        self._manifest = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _ensure_loaded(self):
+        if self._manifest is not None:
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self._manifest = json.load(f)["segments"]
+        except FileNotFoundError:
+            self._manifest = [] if not os.path.isdir(self.directory) else self._rebuild_manifest()
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            logger.error(f"Ticket log manifest unreadable, rebuilding from segments: {e}")
+            self._manifest = self._rebuild_manifest()
+
+    def _rebuild_manifest(self):
+        segments = []
+        for name in sorted(os.listdir(self.directory)):
+            if ".jsonl" not in name or name.endswith(".tmp"):
+                continue
+            entries = self._read(name)
+            segments.append(self._describe(name, entries))
+            self._write_ids(segments[-1]["ids"], entries)
+        self._write_manifest(segments)
+        return segments
+
+    def _describe(self, name, entries):
+        return {
+            "name": name,
+            "month": name[:7],
+            "entries": len(entries),
+            "max_numbers": ticket_number_maxima(entries),
+            "ids": f"{name.split('.jsonl')[0]}.ids"
+        }
+
+    def _write_atomic(self, name, data):
+        temp_file = self._path(f"{name}.tmp")
+        with open(temp_file, "wb") as f:
+            f.write(data)
+        os.replace(temp_file, self._path(name))
+
+    def _write_ids(self, name, entries):
+        ids = "\n".join(str(entry["unique_id"]) for entry in entries if entry.get("unique_id"))
+        self._write_atomic(name, ids.encode("utf-8"))
+
+    def _write_manifest(self, segments):
+        self._write_atomic("manifest.json", json.dumps({"segments": segments}, indent=4).encode("utf-8"))
+
+    def _read(self, name):
+        entries = []
+        try:
+            opener = gzip.open if name.endswith(".gz") else open
+            with opener(self._path(name), "rt", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Skipping corrupt line {line_number} in ticket log segment {name}: {e}")
+        except (OSError, EOFError) as e:
+            logger.error(f"Ticket log segment {name} is unreadable, skipping it: {e}")
+        return entries
+
+    def segments(self):
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._manifest)
+
+    def read_segment(self, name):
+        """Entries of one segment, keeping the most recently used segments in memory"""
+        with self._lock:
+            if name in self._cache:
+                self._cache.move_to_end(name)
+                return self._cache[name]
+        entries = self._read(name)
+        with self._lock:
+            self._cache[name] = entries
+            while len(self._cache) > TICKET_LOG_SEGMENT_CACHE:
+                self._cache.popitem(last=False)
+        return entries
+
+    def iter_entries(self, since_month=None):
+        """Archived entries, newest segment first, loading segments only as they are reached"""
+        for segment in sorted(self.segments(), key=lambda segment: segment["name"], reverse=True):
+            if since_month and segment["month"] < since_month:
+                break
+            yield from self.read_segment(segment["name"])
+
+    def max_numbers(self):
+        maxima = {}
+        for segment in self.segments():
+            for prefix, number in segment["max_numbers"].items():
+                maxima[prefix] = max(maxima.get(prefix, 0), number)
+        return maxima
+
+    def unique_ids(self):
+        ids = set()
+        for segment in self.segments():
+            try:
+                with open(self._path(segment["ids"]), "r", encoding="utf-8") as f:
+                    ids.update(line.strip() for line in f if line.strip())
+            except OSError:
+                ids.update(str(entry["unique_id"]) for entry in self.read_segment(segment["name"]) if entry.get("unique_id"))
+        return ids
+
+    def archive(self, entries):
+        """Write entries into new segments, one per month; existing segments are never rewritten"""
+        by_month = {}
+        for entry in entries:
+            by_month.setdefault(ticket_log_month(entry), []).append(entry)
+        with self._lock:
+            self._ensure_loaded()
+            os.makedirs(self.directory, exist_ok=True)
+            segments = list(self._manifest)
+            names = {segment["name"] for segment in segments}
+            for month, month_entries in sorted(by_month.items()):
+                extension = ".jsonl.gz" if self.compress else ".jsonl"
+                name = f"{month}{extension}"
+                part = 1
+                while name in names or os.path.exists(self._path(name)):
+                    part += 1
+                    name = f"{month}.{part}{extension}"
+                data = "".join(encode_log_entry(entry) + "\n" for entry in month_entries).encode("utf-8")
+                self._write_atomic(name, gzip.compress(data) if self.compress else data)
+                segment = self._describe(name, month_entries)
+                self._write_ids(segment["ids"], month_entries)
+                segments.append(segment)
+                names.add(name)
+            self._write_manifest(segments)
+            self._manifest = segments
+
+ticket_log_archive = TicketLogArchive(TICKET_LOG_ARCHIVE_DIR)
+
+def rotate_ticket_log(now=None):
+    """Move tickets closed before this month (or abandoned long ago) from the active log into the archive"""
+    now = now or datetime.now(UTC)
+    current_month = now.strftime("%Y-%m")
+    stale_before = (now - timedelta(days=TICKET_LOG_STALE_DAYS)).isoformat()
+    expired = [
+        entry for entry in ticket_log_store.entries()
+        if (ticket_log_month(entry) or current_month) < current_month
+        and (entry.get("closed_at") or (entry.get("opened_at") or "") < stale_before)
+    ]
+    if expired:
+        # Archive first: a crash in between can only duplicate entries, never lose them
+        ticket_log_archive.archive(expired)
+        ticket_log_store.remove([entry.get("channel_name") for entry in expired])
+        ticket_log_store.flush()
+        logger.info(f"Archived {len(expired)} ticket log entries")
+    return len(expired)
+
+def iter_ticket_log(since_month=None):
+    """Every ticket log entry, active first, then archived segments lazily (newest first)"""
+    seen = set()
+    for entry in ticket_log_store.entries():
+        seen.add(entry.get("channel_name"))
+        yield entry
+    for entry in ticket_log_archive.iter_entries(since_month):
+        if entry.get("channel_name") not in seen:
+            seen.add(entry.get("channel_name"))
+            yield entry
+
+def load_full_ticket_log():
+    try:
+        return list(iter_ticket_log())
+    except Exception as e:
+        logger.error(f"Error loading ticket log archive: {e}")
+        return load_ticket_log()
+
+class TranscriptJournal:
+    """Per-ticket JSON-lines journal of messages captured live from the gateway"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def _path(self, channel_id):
+        return os.path.join(self.directory, f"{channel_id}.jsonl")
+
+    def _append(self, channel_id, record):
+        line = encode_log_entry(record)
+        with self._lock:
+            self._pending.setdefault(channel_id, []).append(line)
+
+    def begin(self, channel_id):
+        """Mark the journal as complete from the ticket's creation onwards"""
+        self._append(channel_id, {"begin": datetime.now(UTC).isoformat()})
+
+    def record(self, message):
+        self._append(message.channel.id, {
+            "id": message.id,
+            "author_id": message.author.id,
+            "author_name": message.author.name,
+            "bot": message.author.bot,
+            "staff": is_staff_member(message.author),
+            "created_at": message.created_at.isoformat(),
+            "content": message.content,
+        })
+
+    def is_complete(self, channel_id):
+        """True if the journal has its begin marker, i.e. it covers the whole ticket"""
+        self.flush()
+        try:
+            with open(self._path(channel_id), "r", encoding="utf-8") as f:
+                return any(line.startswith('{"begin":') for line in f)
+        except FileNotFoundError:
+            return False
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            for channel_id, lines in pending.items():
+                with open(self._path(channel_id), "a", encoding="utf-8") as f:
+                    f.write("".join(line + "\n" for line in lines))
+
+    def read(self, channel_id):
+        """Return the journaled messages in order (edits applied), or None if the journal is incomplete"""
+        self.flush()
+        path = self._path(channel_id)
+        if not os.path.exists(path):
+            return None
+        complete = False
+        messages = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "begin" in record:
+                    complete = True
+                elif "id" in record:
+                    messages[record["id"]] = record
+        if not complete:
+            return None
+        return [messages[message_id] for message_id in sorted(messages)]
+
+    def discard(self, channel_id):
+        with self._flush_lock:
+            with self._lock:
+                self._pending.pop(channel_id, None)
+            try:
+                os.remove(self._path(channel_id))
+            except FileNotFoundError:
+                pass
+
+class JournalAuthor:
+    def __init__(self, record):
+        self.id = record["author_id"]
+        self.name = record["author_name"]
+        self.bot = record["bot"]
+        self.roles = [discord.Object(id=CLAIM_ROLE_ID)] if record["staff"] else []
+
+class DeletedTicketChannel:
+    """Stand-in for a ticket channel deleted while the bot was offline; history comes from the journal only"""
+
+    def __init__(self, record, name, guild=None):
+        self.id = record.channel_id
+        self.guild = guild
+        self.name = name
+        self.created_at = discord.utils.snowflake_time(record.channel_id)
+
+    async def history(self, **kwargs):
+        return
+        yield
+
+class JournalMessage:
+    """Minimal stand-in for discord.Message rebuilt from a journal record"""
+
+    def __init__(self, record):
+        self.id = record["id"]
+        self.content = record["content"]
+        self.created_at = datetime.fromisoformat(record["created_at"])
+        self.author = JournalAuthor(record)
+
+transcript_journal = TranscriptJournal(TRANSCRIPT_JOURNAL_DIR)
+transcript_journal_writer = BackgroundFlusher(transcript_journal)
+atexit.register(transcript_journal.flush)
+
+STATS_FIELDS = ("tickets", "duration", "responded", "first_response", "staff_messages", "claimed")
+
+class TicketStatsRollup:
+    """Per-day, per-category, per-language aggregates updated on every close.
+
+    Queries only touch one row per day/category/language (plus one per staff
+    member), so they stay fast however many tickets the log holds.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._buckets = {}
+        self._staff = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def load(self, entries=None):
+        """Load the rollup, rebuilding it from the ticket log when missing or unreadable"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            with self._lock:
+                self._buckets = {tuple(row[:3]): row[3:] for row in data["buckets"]}
+                self._staff = {(*row[:3], int(row[3])): row[4:] for row in data["staff"]}
+            return
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            logger.error(f"Error loading ticket stats, rebuilding from the log: {e}")
+        self.rebuild(entries if entries is not None else load_full_ticket_log())
+
+    def rebuild(self, entries):
+        with self._lock:
+            self._buckets = {}
+            self._staff = {}
+        for entry in entries:
+            self.add(entry)
+        logger.info(f"Rebuilt ticket stats from {len(entries)} log entries")
+
+    def add(self, entry):
+        closed_at = entry.get("closed_at")
+        if not closed_at:
+            return
+        closed = datetime.fromisoformat(closed_at)
+        duration = entry.get("duration_seconds")
+        if duration is None and entry.get("opened_at"):
+            duration = (closed - datetime.fromisoformat(entry["opened_at"])).total_seconds()
+        first_response = entry.get("first_response")
+        key = (closed.strftime("%Y-%m-%d"), entry.get("category") or "Unknown", entry.get("language") or "en")
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [0] * len(STATS_FIELDS)
+            bucket[0] += 1
+            bucket[1] += duration or 0
+            if first_response is not None:
+                bucket[2] += 1
+                bucket[3] += first_response
+            bucket[4] += entry.get("staff_messages") or 0
+            bucket[5] += 1 if entry.get("claimed_by") else 0
+            for user_id, _ in entry.get("claimers") or []:
+                self._staff_row(key, user_id)[0] += 1
+            for user_id, count in (entry.get("staff_author_messages") or {}).items():
+                self._staff_row(key, user_id)[1] += count
+            self._dirty = True
+
+    def _staff_row(self, key, user_id):
+        staff_key = (*key, int(user_id))
+        row = self._staff.get(staff_key)
+        if row is None:
+            row = self._staff[staff_key] = [0, 0]
+        return row
+
+    def query(self, days=None, category=None, language=None):
+        """Totals plus per-category, per-language and per-staff breakdowns for the matching tickets"""
+        since = (datetime.now(UTC) - timedelta(days=days - 1)).strftime("%Y-%m-%d") if days else ""
+
+        def matches(day, bucket_category, bucket_language):
+            return day >= since and category in (None, bucket_category) and language in (None, bucket_language)
+
+        totals = [0] * len(STATS_FIELDS)
+        by_category, by_language, staff = {}, {}, {}
+        with self._lock:
+            for (day, bucket_category, bucket_language), bucket in self._buckets.items():
+                if not matches(day, bucket_category, bucket_language):
+                    continue
+                for target in (totals, by_category.setdefault(bucket_category, [0] * len(STATS_FIELDS)),
+                               by_language.setdefault(bucket_language, [0] * len(STATS_FIELDS))):
+                    for i, value in enumerate(bucket):
+                        target[i] += value
+            for (day, bucket_category, bucket_language, user_id), (claims, messages) in self._staff.items():
+                if not matches(day, bucket_category, bucket_language):
+                    continue
+                row = staff.setdefault(user_id, [0, 0])
+                row[0] += claims
+                row[1] += messages
+        return {"totals": totals, "by_category": by_category, "by_language": by_language, "staff": staff}
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "buckets": [[*key, *bucket] for key, bucket in self._buckets.items()],
+                "staff": [[*key, *row] for key, row in self._staff.items()]
+            }
+            self._dirty = False
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(temp_file, self.path)
+
+class TranscriptSearchIndex:
+    """SQLite FTS5 index over closed ticket transcripts, keyed by unique_id and channel_name.
+
+    All methods block, so call them through asyncio.to_thread. If this SQLite
+    build has no FTS5 the index disables itself and search returns nothing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.available = True
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS transcripts USING fts5("
+                "unique_id, channel_name, participants, category UNINDEXED, closed_at UNINDEXED, content, "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS documents (key TEXT PRIMARY KEY, doc_id INTEGER, has_content INTEGER)"
+            )
+            self._db = db
+        return self._db
+
+    @staticmethod
+    def key(entry):
+        return f"{entry.get('unique_id')}|{entry.get('channel_name')}"
+
+    @staticmethod
+    def _participants(entry):
+        user_ids = {entry.get("opened_by"), entry.get("claimed_by"), entry.get("closer")}
+        user_ids.update(user_id for user_id, _ in entry.get("claimers") or [])
+        user_ids.update(entry.get("author_messages") or {})
+        return " ".join(str(user_id) for user_id in user_ids if user_id)
+
+    def _insert(self, db, entry, content):
+        key = self.key(entry)
+        row = db.execute("SELECT doc_id FROM documents WHERE key = ?", (key,)).fetchone()
+        if row:
+            db.execute("DELETE FROM transcripts WHERE rowid = ?", (row[0],))
+        cursor = db.execute(
+            "INSERT INTO transcripts (unique_id, channel_name, participants, category, closed_at, content) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (entry.get("unique_id"), entry.get("channel_name"), self._participants(entry),
+             entry.get("category"), entry.get("closed_at"), content or "")
+        )
+        db.execute(
+            "INSERT OR REPLACE INTO documents (key, doc_id, has_content) VALUES (?, ?, ?)",
+            (key, cursor.lastrowid, 1 if content else 0)
+        )
+
+    def add_many(self, items):
+        """Index (or re-index) (entry, content) pairs in one transaction; content None stores only metadata"""
+        if not self.available:
+            return
+        with self._lock:
+            try:
+                db = self._connect()
+            except sqlite3.OperationalError as e:
+                logger.error(f"Transcript search disabled: {e}")
+                self.available = False
+                return
+            with db:
+                for entry, content in items:
+                    self._insert(db, entry, content)
+
+    def add(self, entry, content=None):
+        self.add_many([(entry, content)])
+
+    def add_file(self, entry, path, compressed=False):
+        opener = gzip.open if compressed else open
+        with opener(path, "rb") as f:
+            self.add(entry, f.read().decode("utf-8", errors="replace"))
+
+    def indexed(self):
+        """Map of every indexed ticket key to whether its transcript text is indexed"""
+        if not self.available:
+            return {}
+        with self._lock:
+            return {key: bool(has_content) for key, has_content in self._connect().execute(
+                "SELECT key, has_content FROM documents"
+            )}
+
+    @staticmethod
+    def _match_expression(query):
+        # Quote every term so user input can never be parsed as FTS syntax
+        return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+    def search(self, query, limit=TRANSCRIPT_SEARCH_RESULTS):
+        expression = self._match_expression(query)
+        if not self.available or not expression:
+            return []
+        with self._lock:
+            return self._connect().execute(
+                "SELECT unique_id, channel_name, category, closed_at, "
+                "snippet(transcripts, 5, '**', '**', '…', 16) FROM transcripts "
+                "WHERE transcripts MATCH ? ORDER BY rank LIMIT ?",
+                (expression, limit)
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+transcript_index = TranscriptSearchIndex(TRANSCRIPT_INDEX_FILE)
+
+ticket_stats = TicketStatsRollup(TICKET_STATS_FILE)
+ticket_stats_writer = BackgroundFlusher(ticket_stats)
+atexit.register(ticket_stats.flush)
+
+TICKET_COLUMNS = (
+    ("opened_at", "d"), ("closed_at", "d"), ("duration", "d"), ("first_response", "d"),
+    ("staff_messages", "l"), ("opened_by", "q"), ("claimed_by", "q"), ("category", "h"), ("language", "h")
+)
+
+def export_ticket_columns(entries, directory=TICKET_COLUMNS_DIR):
+    """Write closed tickets as one little-endian binary file per column plus a manifest.
+
+    Each column loads with numpy.fromfile(path, dtype=manifest["columns"][name]);
+    times are epoch seconds, missing values are NaN or 0, and category/language
+    are codes into the manifest's lookup lists.
+    """
+    columns = {name: array.array(typecode) for name, typecode in TICKET_COLUMNS}
+    categories, languages = {}, {}
+    for entry in entries:
+        if not entry.get("closed_at"):
+            continue
+        closed = datetime.fromisoformat(entry["closed_at"])
+        opened = datetime.fromisoformat(entry["opened_at"]) if entry.get("opened_at") else closed
+        first_response = entry.get("first_response")
+        columns["opened_at"].append(opened.timestamp())
+        columns["closed_at"].append(closed.timestamp())
+        columns["duration"].append(entry.get("duration_seconds") or (closed - opened).total_seconds())
+        columns["first_response"].append(first_response if first_response is not None else math.nan)
+        columns["staff_messages"].append(entry.get("staff_messages") or 0)
+        columns["opened_by"].append(int(entry.get("opened_by") or 0))
+        columns["claimed_by"].append(int(entry.get("claimed_by") or 0))
+        columns["category"].append(categories.setdefault(entry.get("category") or "Unknown", len(categories)))
+        columns["language"].append(languages.setdefault(entry.get("language") or "en", len(languages)))
+
+    os.makedirs(directory, exist_ok=True)
+    dtypes = {}
+    for name, values in columns.items():
+        if sys.byteorder != "little":
+            values.byteswap()
+        with open(os.path.join(directory, f"{name}.bin"), "wb") as f:
+            values.tofile(f)
+        dtypes[name] = f"<{'f' if values.typecode == 'd' else 'i'}{values.itemsize}"
+    manifest = {
+        "rows": len(columns["closed_at"]),
+        "columns": dtypes,
+        "category": list(categories),
+        "language": list(languages),
+        "exported_at": datetime.now(UTC).isoformat()
+    }
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+def get_ticket_prefix(category_key):
+    return category_key.split()[1].lower() + "-"
+
+def rebuild_ticket_counters():
+    """Seed the per-category counters from the active log and the archive manifest (runs once per process)"""
+    global ticket_counters_loaded
+    maxima = ticket_number_maxima(load_ticket_log())
+    try:
+        archived = ticket_log_archive.max_numbers()
+    except Exception as e:
+        logger.error(f"Error reading ticket log archive: {e}")
+        archived = {}
+    for category in ticket_counters:
+        prefix = get_ticket_prefix(category)
+        ticket_counters[category] = max(maxima.get(prefix, 0), archived.get(prefix, 0))
+    ticket_counters_loaded = True
+
+def get_next_ticket_number(category_key):
+    """Get the next available ticket number for a category without reserving it"""
+    try:
+        if not ticket_counters_loaded:
+            rebuild_ticket_counters()
+        return ticket_counters[category_key] + 1
     except Exception as e:
         logger.error(f"Error getting next ticket number: {e}")
         return int(time.time()) % 10000 
 
-def generate_unique_ticket_id():
-    """Generate a unique 5-character ticket ID"""
-    used_ids = set()
+async def reserve_ticket_number(category_key):
+    """Atomically reserve the next ticket number for a category"""
+    async with ticket_counter_lock:
+        number = get_next_ticket_number(category_key)
+        if category_key in ticket_counters:
+            ticket_counters[category_key] = number
+        return number
+
+def load_used_ticket_ids():
+    """Seed the in-memory ticket ID registry from the ticket log (runs once per process)"""
+    global used_ticket_ids_loaded
     try:
-        logs = load_ticket_log()
-        for log in logs:
+        for log in load_ticket_log():
             if "unique_id" in log:
-                used_ids.add(log["unique_id"])
-    except Exception:
-        pass
-    
+                used_ticket_ids.add(log["unique_id"])
+        used_ticket_ids.update(ticket_log_archive.unique_ids())
+    except Exception as e:
+        logger.error(f"Error loading used ticket IDs: {e}")
+    used_ticket_ids_loaded = True
+
+def generate_unique_ticket_id():
+    """Generate a unique 5-character ticket ID"""
+    if not used_ticket_ids_loaded:
+        load_used_ticket_ids()
+
     while True:
         new_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-        if new_id not in used_ids:
+        if new_id not in used_ticket_ids:
+            used_ticket_ids.add(new_id)
             return new_id
 
-async def send_transcript_to_user(user: discord.Member, transcript_content: str, channel_name: str, ticket_info=None, staff_embed=None):
-    """Send transcript to user via DM"""
-    try:
-        embed = discord.Embed(
-            title="📜 Your Ticket Transcript",
-            description=(
-                "📄 Here is the transcript of your ticket. Below you will find all the details about the ticket, "
-                "including who closed it and how long it was active.\n\n"
-                "📋 Ticket Details:\n"
-                f"• 🔒 **Closed By:** {staff_embed.description.split('Closed By:**')[1].split('\n')[0] if staff_embed else 'Unknown'}\n"
-                f"• ⏰ **Closed At:** {ticket_info.get('closed_at', 'Unknown')}\n"
-                f"• ⏳ **Duration:** {ticket_info.get('duration', 'Unknown')}\n"
-                f"• 📂 **Category:** {ticket_info.get('category', 'Unknown')}\n"
-                f"• 🌍 **Language:** {'English 🇬🇧' if ticket_info.get('language') == 'en' else 'Italian 🇮🇹'}\n"
-                f"• 🎫 **Ticket ID:** {ticket_info.get('unique_id', 'Unknown')}\n\n"
-                "🙏 Thank you!"
-            ),
-            color=discord.Color.blue()
-        )
-        file = discord.File(
-            io.StringIO(transcript_content),
-            filename=f"{channel_name}_transcript.txt"
-        )
-        await user.send(embed=embed, file=file)
-    except Exception as e:
-        logger.error(f"Failed to send transcript to user: {e}")
+async def send_transcript_to_user(user: discord.Member, transcript: "TranscriptFile", channel_name: str, ticket_info=None, staff_embed=None):
+    """Send transcript to user via DM; errors propagate so the delivery queue can retry"""
+    embed = discord.Embed(
+        title="📜 Your Ticket Transcript",
+        description=(
+            "📄 Here is the transcript of your ticket. Below you will find all the details about the ticket, "
+            "including who closed it and how long it was active.\n\n"
+            "📋 Ticket Details:\n"
+            f"• 🔒 **Closed By:** {staff_embed.description.split('Closed By:**')[1].split('\n')[0] if staff_embed else 'Unknown'}\n"
+            f"• ⏰ **Closed At:** {ticket_info.get('closed_at', 'Unknown')}\n"
+            f"• ⏳ **Duration:** {ticket_info.get('duration', 'Unknown')}\n"
+            f"• 📂 **Category:** {ticket_info.get('category', 'Unknown')}\n"
+            f"• 🌍 **Language:** {'English 🇬🇧' if ticket_info.get('language') == 'en' else 'Italian 🇮🇹'}\n"
+            f"• 🎫 **Ticket ID:** {ticket_info.get('unique_id', 'Unknown')}\n\n"
+            "🙏 Thank you!"
+        ),
+        color=discord.Color.blue()
+    )
+    await send_transcript_files(user, transcript, channel_name, discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES, embed=embed)
 
 TICKET_CATEGORIES = {
     "Cattegory 1": {
@@ -205,20 +1330,581 @@ TICKET_CATEGORIES = {
     }
 }
 
+TICKET_CATEGORY_IDS = {config["id"] for config in TICKET_CATEGORIES.values()}
+
+def is_ticket_channel(channel):
+    return getattr(channel, "category_id", None) in TICKET_CATEGORY_IDS and channel.id not in channel_pool
+
 SUPPORT_ROLES = {
     "en": 1234567890,
     "it": 1234567890
 }
 
-bot = commands.Bot(command_prefix="!", intents=discord.Intents.all())
+class ExpiringDict(MutableMapping):
+    """Dict whose entries expire, evicted lazily on access and by periodic sweeps"""
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.evictions = 0
+        self._data = {}
+
+    def set(self, key, value, expires_at=None):
+        if expires_at is None and self.ttl is not None:
+            expires_at = time.time() + self.ttl
+        self._data[key] = (value, expires_at)
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __getitem__(self, key):
+        value, expires_at = self._data[key]
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            self.evictions += 1
+            raise KeyError(key)
+        return value
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __iter__(self):
+        now = time.time()
+        return iter([key for key, (_, expires_at) in self._data.items() if expires_at is None or expires_at > now])
+
+    def __len__(self):
+        now = time.time()
+        return sum(1 for _, expires_at in self._data.values() if expires_at is None or expires_at > now)
+
+    def evict_expired(self):
+        now = time.time()
+        expired = [key for key, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        self.evictions += len(expired)
+        return len(expired)
+
+    def stats(self):
+        return {"size": len(self), "evictions": self.evictions}
+
+class LRUCache:
+    """Small bounded cache with per-entry TTL for lazily fetched Discord objects"""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value, expires_at = self._data[key]
+        except KeyError:
+            return default
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def __contains__(self, key):
+        sentinel = object()
+        return self.get(key, sentinel) is not sentinel
+
+    def put(self, key, value):
+        self._data[key] = (value, time.time() + self.ttl if self.ttl is not None else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+def build_intents():
+    if not MINIMAL_INTENTS:
+        return discord.Intents.all()
+    # Roles come with interaction and message payloads; only what the handlers use is enabled
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.message_content = True
+    intents.voice_states = True
+    return intents
+
+class TicketBot(commands.Bot):
+    async def setup_hook(self):
+        if METRICS_ENABLED:
+            instrument_http_client(self.http)
+            logging.getLogger("discord.http").addFilter(RateLimitLogCounter())
+            register_gauges()
+            self.metrics_runner = await start_metrics_server()
+        # One persistent instance per view handles every message by custom_id
+        self.add_view(TicketControls(None))
+        self.add_view(TicketPanel())
+        await asyncio.to_thread(ticket_log_store.entries)
+        try:
+            await asyncio.to_thread(rotate_ticket_log)
+        except Exception as e:
+            logger.error(f"Error archiving ticket log: {e}")
+        await asyncio.to_thread(ticket_stats.load)
+        await asyncio.to_thread(ticket_state.load)
+        await transcript_delivery.start()
+        self.sweeper_task = asyncio.create_task(sweep_expiring_maps())
+        rebuild_ticket_counters()
+        load_used_ticket_ids()
+        try:
+            await sync_command_tree()
+        except Exception as e:
+            logger.error(f"Error syncing command tree: {e}")
+
+    async def _run_event(self, coro, event_name, *args, **kwargs):
+        session = profiling_session
+        if session is None:
+            return await super()._run_event(coro, event_name, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            await super()._run_event(coro, event_name, *args, **kwargs)
+        finally:
+            session.record("event", {"handler": f"{event_name}:{coro.__name__}"}, time.perf_counter() - start)
+
+    async def close(self):
+        try:
+            if profiling_session is not None:
+                profiling_session.finish()
+            if getattr(self, "metrics_runner", None):
+                await self.metrics_runner.cleanup()
+            await transcript_delivery.stop()
+            await ticket_log_writer.close()
+            await ticket_state_writer.close()
+            await transcript_journal_writer.close()
+            await ticket_stats_writer.close()
+            await asyncio.to_thread(transcript_index.close)
+        except Exception as e:
+            logger.error(f"Error flushing ticket log on shutdown: {e}")
+        await super().close()
+
+bot_intents = build_intents()
+bot = TicketBot(
+    command_prefix="!",
+    intents=bot_intents,
+    member_cache_flags=discord.MemberCacheFlags.from_intents(bot_intents),
+    chunk_guilds_at_startup=not MINIMAL_INTENTS
+)
+member_cache = LRUCache(USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+user_cache = LRUCache(USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+async def resolve_member(guild, user_id):
+    """Member from the gateway cache, falling back to a cached REST fetch"""
+    member = guild.get_member(user_id)
+    if member is not None:
+        return member
+    if user_id in member_cache:
+        return member_cache.get(user_id)
+    try:
+        member = await guild.fetch_member(user_id)
+    except NotFound:
+        member = None
+    except HTTPException as e:
+        # Transient or permission errors: don't cache, the caller keeps the bare User
+        logger.warning(f"Could not fetch member {user_id}: {e}")
+        return None
+    member_cache.put(user_id, member)
+    return member
+
+async def resolve_user(user_id):
+    """User from the gateway cache, falling back to a cached REST fetch"""
+    user = bot.get_user(user_id)
+    if user is not None:
+        return user
+    if user_id in user_cache:
+        return user_cache.get(user_id)
+    try:
+        user = await bot.fetch_user(user_id)
+    except NotFound:
+        user = None
+    user_cache.put(user_id, user)
+    return user
+
+async def with_member_author(message, guild):
+    """Swap a bare User author (uncached member) for the Member so role checks work"""
+    if guild is not None and not hasattr(message.author, "roles"):
+        member = await resolve_member(guild, message.author.id)
+        if member is not None:
+            message.author = member
+    return message
+
 ticket_counters = {category: 0 for category in TICKET_CATEGORIES}
-ticket_data = {}
+ticket_counters_loaded = False
+ticket_counter_lock = asyncio.Lock()
+startup_semaphore = asyncio.Semaphore(STARTUP_CONCURRENCY)
+used_ticket_ids = set()
+used_ticket_ids_loaded = False
+tickets = {}
 notified_users = set()
 
-claim_cooldowns = {}
-rename_cooldowns = {}
-ticket_claimers = {}
-ticket_renames = {}
+class OpenTicketIndex:
+    """Counts of open tickets per user and per category, kept in step with tickets"""
+
+    def __init__(self):
+        self._by_user = {}
+        self._by_category = {}
+
+    def add(self, record):
+        if record.user_id is not None:
+            self._by_user[record.user_id] = self._by_user.get(record.user_id, 0) + 1
+        self._by_category[record.category] = self._by_category.get(record.category, 0) + 1
+
+    def remove(self, record):
+        for counts, key in ((self._by_user, record.user_id), (self._by_category, record.category)):
+            if key in counts:
+                counts[key] -= 1
+                if counts[key] <= 0:
+                    del counts[key]
+
+    def rebuild(self, records):
+        self._by_user = {}
+        self._by_category = {}
+        for record in records:
+            self.add(record)
+
+    def for_user(self, user_id):
+        return self._by_user.get(user_id, 0)
+
+    def for_category(self, category):
+        return self._by_category.get(category, 0)
+
+open_ticket_index = OpenTicketIndex()
+
+claim_cooldowns = ExpiringDict()
+
+class ClaimEvent(NamedTuple):
+    user_id: int
+    claimed_at: datetime
+
+class RenameEvent(NamedTuple):
+    old_name: str
+    new_name: str
+    user_id: int
+    renamed_at: datetime
+
+class TicketRecord:
+    """Single source of truth for an open ticket's state"""
+
+    __slots__ = (
+        "channel_id", "user_id", "claimed_by", "language", "additional_info",
+        "category", "unique_id", "opened_at", "claims", "renames"
+    )
+
+    def __init__(self, channel_id, user_id=None, language="en", category="Unknown", unique_id="Unknown",
+                 additional_info=None, opened_at=None, claimed_by=None, claims=None, renames=None):
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.claimed_by = claimed_by
+        self.language = language
+        self.additional_info = additional_info
+        self.category = category
+        self.unique_id = unique_id
+        self.opened_at = opened_at or datetime.now(UTC)
+        self.claims = claims if claims is not None else []
+        self.renames = renames if renames is not None else []
+
+    def claim(self, user_id, claimed_at):
+        self.claimed_by = user_id
+        self.claims.append(ClaimEvent(user_id, claimed_at))
+
+    def rename(self, old_name, new_name, user_id, renamed_at):
+        self.renames.append(RenameEvent(old_name, new_name, user_id, renamed_at))
+
+    def to_dict(self):
+        return {
+            "channel_id": self.channel_id,
+            "user_id": self.user_id,
+            "claimed_by": self.claimed_by,
+            "language": self.language,
+            "additional_info": self.additional_info,
+            "category": self.category,
+            "unique_id": self.unique_id,
+            "opened_at": self.opened_at.isoformat(),
+            "claims": [[c.user_id, c.claimed_at.isoformat()] for c in self.claims],
+            "renames": [[r.old_name, r.new_name, r.user_id, r.renamed_at.isoformat()] for r in self.renames]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["channel_id"],
+            user_id=data.get("user_id"),
+            claimed_by=data.get("claimed_by"),
+            language=data.get("language", "en"),
+            additional_info=data.get("additional_info"),
+            category=data.get("category", "Unknown"),
+            unique_id=data.get("unique_id", "Unknown"),
+            opened_at=datetime.fromisoformat(data["opened_at"]) if data.get("opened_at") else None,
+            claims=[ClaimEvent(uid, datetime.fromisoformat(dt)) for uid, dt in data.get("claims", [])],
+            renames=[
+                RenameEvent(old, new, uid, datetime.fromisoformat(dt)) for old, new, uid, dt in data.get("renames", [])
+            ]
+        )
+
+    def to_log_entry(self, channel_name, **fields):
+        """Ticket log entry for this ticket; fields override the open-ticket defaults"""
+        entry = {
+            "channel_name": channel_name,
+            "category": self.category,
+            "opened_by": self.user_id,
+            "claimed_by": self.claimed_by,
+            "renames": [[r.old_name, r.new_name, r.user_id, r.renamed_at.isoformat()] for r in self.renames],
+            "opened_at": self.opened_at.isoformat(),
+            "closed_at": None,
+            "duration": None,
+            "language": self.language,
+            "staff_messages": 0,
+            "claimers": [[c.user_id, c.claimed_at.isoformat()] for c in self.claims],
+            "closer": None,
+            "unique_id": self.unique_id
+        }
+        entry.update(fields)
+        return entry
+
+class TicketStateStore:
+    """Snapshot plus write-ahead log for the open TicketRecords and claim_cooldowns.
+
+    Every mutation goes through a WAL operation that is applied in memory at once
+    and appended to disk by the background flusher. Operations carry a sequence
+    number so replaying a WAL over a newer snapshot is harmless.
+    """
+
+    def __init__(self, snapshot_path, wal_path):
+        self.snapshot_path = snapshot_path
+        self.wal_path = wal_path
+        self._seq = 0
+        self._wal_ops = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    @staticmethod
+    def _record_for(channel_id):
+        """Record for an open ticket; one opened before this store existed is dated from its channel's creation"""
+        record = tickets.get(channel_id)
+        if record is None:
+            record = tickets[channel_id] = TicketRecord(channel_id, opened_at=discord.utils.snowflake_time(channel_id))
+        return record
+
+    def _apply(self, op):
+        kind = op["op"]
+        channel_id = op["channel"]
+        if kind == "open":
+            if channel_id in tickets:
+                open_ticket_index.remove(tickets[channel_id])
+            tickets[channel_id] = TicketRecord.from_dict(op["data"])
+            open_ticket_index.add(tickets[channel_id])
+        elif kind == "claim":
+            self._record_for(channel_id).claim(op["user"], datetime.fromisoformat(op["at"]))
+        elif kind == "rename":
+            self._record_for(channel_id).rename(
+                op["old"], op["new"], op["user"], datetime.fromisoformat(op["at"])
+            )
+        elif kind == "cooldown":
+            claim_cooldowns.set(channel_id, op["until"], expires_at=op["until"])
+        elif kind == "close":
+            record = tickets.pop(channel_id, None)
+            if record is not None:
+                open_ticket_index.remove(record)
+            claim_cooldowns.pop(channel_id, None)
+
+    def _record(self, op):
+        self._seq += 1
+        op["seq"] = self._seq
+        self._apply(op)
+        with self._lock:
+            self._pending.append(("wal", encode_log_entry(op)))
+            self._wal_ops += 1
+            if self._wal_ops >= TICKET_STATE_CHECKPOINT_OPS:
+                # Serialize on the event loop so the snapshot sees a consistent state
+                self._pending.append(("snapshot", self._encode_snapshot()))
+                self._wal_ops = 0
+        ticket_state_writer.notify()
+
+    def _encode_snapshot(self):
+        now = time.time()
+        return json.dumps({
+            "seq": self._seq,
+            "tickets": [record.to_dict() for record in tickets.values()],
+            "cooldowns": {cid: until for cid, until in claim_cooldowns.items() if until > now}
+        }, separators=(",", ":"))
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    def open_ticket(self, record):
+        self._record({"op": "open", "channel": record.channel_id, "data": record.to_dict()})
+
+    def claim(self, channel_id, user_id, claimed_at, cooldown_until):
+        self._record({"op": "claim", "channel": channel_id, "user": user_id, "at": claimed_at.isoformat()})
+        self._record({"op": "cooldown", "channel": channel_id, "until": cooldown_until})
+
+    def rename(self, channel_id, old_name, new_name, user_id, renamed_at):
+        self._record({
+            "op": "rename", "channel": channel_id, "old": old_name, "new": new_name,
+            "user": user_id, "at": renamed_at.isoformat()
+        })
+
+    def close_ticket(self, channel_id):
+        if channel_id in tickets or channel_id in claim_cooldowns:
+            self._record({"op": "close", "channel": channel_id})
+
+    def load(self):
+        """Rebuild the in-memory state from the snapshot and WAL; no Discord API calls"""
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+                snapshot_seq = snapshot.get("seq", 0)
+                for data in snapshot.get("tickets", []):
+                    record = TicketRecord.from_dict(data)
+                    tickets[record.channel_id] = record
+                for cid, until in snapshot.get("cooldowns", {}).items():
+                    claim_cooldowns.set(int(cid), until, expires_at=until)
+            except (json.JSONDecodeError, ValueError) as e:
+                logger.error(f"Error loading ticket state snapshot: {e}")
+        self._seq = snapshot_seq
+        replayed = 0
+        if os.path.exists(self.wal_path):
+            with open(self.wal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        op = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-write
+                        continue
+                    if op.get("seq", 0) <= snapshot_seq:
+                        continue
+                    self._apply(op)
+                    self._seq = max(self._seq, op["seq"])
+                    replayed += 1
+        self._wal_ops = replayed
+        open_ticket_index.rebuild(tickets.values())
+        logger.info(f"Recovered state for {len(tickets)} open tickets ({replayed} WAL operations replayed)")
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+            wal_lines = []
+            for kind, payload in pending:
+                if kind == "wal":
+                    wal_lines.append(payload)
+                    continue
+                if wal_lines:
+                    with open(self.wal_path, "a", encoding="utf-8") as f:
+                        f.write("".join(line + "\n" for line in wal_lines))
+                    wal_lines = []
+                temp_file = f"{self.snapshot_path}.tmp"
+                with open(temp_file, "w", encoding="utf-8") as f:
+                    f.write(payload)
+                os.replace(temp_file, self.snapshot_path)
+                open(self.wal_path, "w").close()
+            if wal_lines:
+                with open(self.wal_path, "a", encoding="utf-8") as f:
+                    f.write("".join(line + "\n" for line in wal_lines))
+
+ticket_state = TicketStateStore(TICKET_STATE_SNAPSHOT_FILE, TICKET_STATE_WAL_FILE)
+ticket_state_writer = BackgroundFlusher(ticket_state)
+atexit.register(ticket_state.flush)
+
+
+class ChannelRenameScheduler:
+    """Per-channel rename queue that coalesces requests and respects Discord's rename bucket"""
+
+    def __init__(self, limit=RENAME_RATE_LIMIT, window=RENAME_RATE_WINDOW):
+        self.limit = limit
+        self.window = window
+        self._applied = ExpiringDict(ttl=window)
+        self._pending = {}
+        self._in_flight = {}
+        self._tasks = {}
+
+    def _delay(self, channel_id, now):
+        applied = self._applied.get(channel_id)
+        if not applied:
+            return 0
+        while applied and applied[0] <= now - self.window:
+            applied.popleft()
+        if len(applied) < self.limit:
+            return 0
+        return applied[0] + self.window - now
+
+    @property
+    def queued_count(self):
+        return len(self._pending)
+
+    def effective_name(self, channel):
+        """The name the channel will have once queued renames are applied"""
+        if channel.id in self._pending:
+            return self._pending[channel.id][1]
+        return self._in_flight.get(channel.id, channel.name)
+
+    def request(self, channel, name):
+        """Queue a rename, replacing any rename still waiting; returns the expected delay in seconds"""
+        self._pending[channel.id] = (channel, name)
+        task = self._tasks.get(channel.id)
+        if task is None or task.done():
+            self._tasks[channel.id] = asyncio.create_task(self._run(channel.id))
+        return self._delay(channel.id, time.time())
+
+    async def _run(self, channel_id):
+        try:
+            while channel_id in self._pending:
+                delay = self._delay(channel_id, time.time())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                channel, name = self._pending.pop(channel_id)
+                if name == channel.name:
+                    continue
+                self._in_flight[channel_id] = name
+                try:
+                    await channel.edit(name=name)
+                except NotFound:
+                    break
+                except HTTPException as e:
+                    logger.error(f"Error renaming channel {channel.name} to {name}: {e}")
+                    if e.status == 429:
+                        metrics.inc("channel_rename_ratelimited_total")
+                        # Treat the bucket as full and retry the newest name once it frees up
+                        self._applied[channel_id] = deque([time.time()] * self.limit)
+                        self._pending.setdefault(channel_id, (channel, name))
+                    continue
+                finally:
+                    self._in_flight.pop(channel_id, None)
+                self.note_rename(channel_id)
+        finally:
+            self._tasks.pop(channel_id, None)
+
+    def note_rename(self, channel_id):
+        """Count a rename made outside the queue against the channel's bucket"""
+        applied = self._applied.get(channel_id) or deque()
+        applied.append(time.time())
+        # The bucket state is only useful until the newest rename leaves the window
+        self._applied[channel_id] = applied
+
+    def forget(self, channel_id):
+        self._pending.pop(channel_id, None)
+        self._applied.pop(channel_id, None)
+        task = self._tasks.pop(channel_id, None)
+        if task:
+            task.cancel()
+
+rename_scheduler = ChannelRenameScheduler()
+expiring_maps = {"claim_cooldowns": claim_cooldowns, "rename_buckets": rename_scheduler._applied}
+
+def format_rename_delay(delay):
+    if delay <= 0:
+        return "now"
+    return f"in about {math.ceil(delay / 60)} minute(s)"
 
 class SupportTicketModal(Modal, title="FORM 1"):
     issue = TextInput(
@@ -240,6 +1926,7 @@ class SupportTicketModal(Modal, title="FORM 1"):
         required=True
     )
 
+    @metrics.timed("ticket_handler_seconds", handler="SupportTicketModal.on_submit")
     async def on_submit(self, interaction: discord.Interaction):
         additional_info = f"**Issue:** {self.issue.value}\n**Contact Method:** {self.contact.value}\n**Urgency:** {self.urgency.value}"
         await interaction.response.defer(ephemeral=True)
@@ -271,6 +1958,7 @@ class StaffApplicationModal(Modal, title="FORM 2"):
         required=True
     )
 
+    @metrics.timed("ticket_handler_seconds", handler="StaffApplicationModal.on_submit")
     async def on_submit(self, interaction: discord.Interaction):
         additional_info = f"**Age:** {self.age.value}\n**Timezone:** {self.timezone.value}\n**Experience:** {self.experience.value}\n**Motivation:** {self.motivation.value}"
         await interaction.response.defer(ephemeral=True)
@@ -283,32 +1971,19 @@ class TicketRenameModal(Modal, title="✏️ Rename Ticket"):
         max_length=50
     )
 
+    @metrics.timed("ticket_handler_seconds", handler="TicketRenameModal.on_submit")
     async def on_submit(self, interaction: discord.Interaction):
         if CLAIM_ROLE_ID not in [role.id for role in interaction.user.roles]:
             return await interaction.response.send_message("🚫 You don't have permission to rename this ticket.", ephemeral=True)
-        old_name = interaction.channel.name
+        old_name = rename_scheduler.effective_name(interaction.channel)
         try:
-            await interaction.channel.edit(name=self.new_name.value)
-            channel_id = interaction.channel.id
-            if channel_id not in ticket_renames:
-                ticket_renames[channel_id] = []
-            ticket_renames[channel_id].append(
-                (old_name, self.new_name.value, interaction.user.id, datetime.now(UTC))
-            )
+            delay = rename_scheduler.request(interaction.channel, self.new_name.value)
+            ticket_state.rename(interaction.channel.id, old_name, self.new_name.value, interaction.user.id, datetime.now(UTC))
             await interaction.response.send_message(
-                f"✏️ Ticket renamed to **{self.new_name.value}**.\n"
-                f"To rename again you must wait 1 minute.", ephemeral=False
+                f"✏️ Ticket will be renamed to **{self.new_name.value}** {format_rename_delay(delay)}.\n"
+                f"Discord allows {RENAME_RATE_LIMIT} renames every {RENAME_RATE_WINDOW // 60} minutes; "
+                "further renames are merged into the latest name.", ephemeral=False
             )
-        except HTTPException as e:
-            if e.status == 429:
-                await interaction.response.send_message(
-                    "⏳ Rate limited by Discord. Please wait a moment before renaming again.", ephemeral=True
-                )
-            else:
-                logger.error(f"Error renaming channel: {e}")
-                await interaction.response.send_message(
-                    "❌ Unable to rename the ticket due to an error.", ephemeral=True
-                )
         except Exception as e:
             logger.error(f"Unexpected error renaming channel: {e}")
             await interaction.response.send_message(
@@ -322,6 +1997,7 @@ class CloseTicketModal(Modal, title="🔒 Close Ticket"):
         required=True
     )
 
+    @metrics.timed("ticket_handler_seconds", handler="CloseTicketModal.on_submit")
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.send_message(f"🔒 Closing ticket for reason: **{self.reason.value}**...", ephemeral=False)
         try:
@@ -345,6 +2021,7 @@ class CategoryQuestionsModal(Modal):
                 custom_id=f"question_{i+1}"
             ))
 
+    @metrics.timed("ticket_handler_seconds", handler="CategoryQuestionsModal.on_submit")
     async def on_submit(self, interaction: discord.Interaction):
         responses = []
         questions = TICKET_CATEGORIES[self.category]["questions"][:5]
@@ -361,13 +2038,15 @@ class TicketControls(View):
         super().__init__(timeout=None)
         self.ticket_owner = ticket_owner
         self.message = None
-        self._refresh_cooldown = {}
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         if not interaction.guild:
             return False
         if any(role.id == CLAIM_ROLE_ID for role in interaction.user.roles) or interaction.user == self.ticket_owner:
             return True
+        record = tickets.get(interaction.channel.id)
+        if record and interaction.user.id == record.user_id:
+            return True
         await interaction.response.send_message("You don't have permission to use these controls.", ephemeral=True)
         return False
 
@@ -381,11 +2060,12 @@ class TicketControls(View):
             logger.error(f"Failed to send error message: {e}")
 
     @discord.ui.button(label="✅ Claim", style=discord.ButtonStyle.success, custom_id="ticket_claim_button")
+    @metrics.timed("ticket_handler_seconds", handler="claim_button")
     async def claim_button(self, interaction: discord.Interaction, button: Button):
         channel_id = interaction.channel.id
         now = time.time()
-        if channel_id in self._refresh_cooldown:
-            remaining = self._refresh_cooldown[channel_id] - now
+        if channel_id in claim_cooldowns:
+            remaining = claim_cooldowns.get(channel_id, now) - now
             if remaining > 0:
                 await interaction.response.send_message(
                     f"Please wait {int(remaining)} seconds before claiming again.",
@@ -395,31 +2075,26 @@ class TicketControls(View):
 
         try:
             await interaction.response.defer()
-            new_name = f"{interaction.channel.name}-claimed"
-            await interaction.channel.edit(name=new_name)
-            
-            ticket_data[channel_id] = ticket_data.get(channel_id, {})
-            ticket_data[channel_id]["claimed_by"] = interaction.user.id
+            new_name = f"{rename_scheduler.effective_name(interaction.channel)}-claimed"
+            rename_scheduler.request(interaction.channel, new_name)
             
-            if channel_id not in ticket_claimers:
-                ticket_claimers[channel_id] = []
-            ticket_claimers[channel_id].append((interaction.user.id, datetime.now(UTC)))
-            
-            self._refresh_cooldown[channel_id] = now + 60
+            ticket_state.claim(channel_id, interaction.user.id, datetime.now(UTC), now + 60)
             
             await interaction.followup.send(
                 f"🎫 Ticket claimed by {interaction.user.mention}",
                 ephemeral=False
             )
-            button.disabled = True
-            if self.message:
-                await self.message.edit(view=self)
+            # Edit a copy so the shared persistent view stays enabled for other tickets
+            view = TicketControls(self.ticket_owner)
+            view.claim_button.disabled = True
+            await interaction.message.edit(view=view)
                 
         except Exception as e:
             logger.error(f"Error in claim button: {e}")
             await interaction.followup.send("Failed to claim ticket. Please try again.", ephemeral=True)
 
     @discord.ui.button(label="🔒 Close", style=discord.ButtonStyle.danger, custom_id="ticket_close_button")
+    @metrics.timed("ticket_handler_seconds", handler="close_button")
     async def close_button(self, interaction: discord.Interaction, button: Button):
         try:
             await interaction.response.send_modal(CloseTicketModal())
@@ -439,6 +2114,7 @@ class TicketPanel(View):
         ],
         custom_id="ticket_panel_select"
     )
+    @metrics.timed("ticket_handler_seconds", handler="ticket_select")
     async def ticket_select(self, interaction: discord.Interaction, select: Select):
         category_name = select.values[0]
         user = interaction.user
@@ -449,6 +2125,11 @@ class TicketPanel(View):
                 ephemeral=True
             )
 
+        # Turn the user away before they fill in the form; create_ticket_channel enforces it for real
+        reason = admission.check(user.id, category_name)
+        if reason:
+            return await interaction.response.send_message(f"🚫 {reason}", ephemeral=True)
+
         try:
             if category_name == "📋 Staff Application":
                 modal = StaffApplicationModal()
@@ -464,6 +2145,7 @@ class TicketPanel(View):
                 ephemeral=True
             )
 
+@metrics.timed("ticket_handler_seconds", handler="ask_for_language")
 async def ask_for_language(interaction: discord.Interaction, category: str, additional_info: str):
     embed = discord.Embed(
         title="🌍 Select Support Language",
@@ -481,23 +2163,345 @@ async def ask_for_language(interaction: discord.Interaction, category: str, addi
                 discord.SelectOption(label="Italian", value="it", emoji="🇮🇹")
             ]
         )
+        @metrics.timed("ticket_handler_seconds", handler="language_select")
         async def select_callback(self, select_interaction: discord.Interaction, select: Select):
             if select_interaction.user.id != interaction.user.id:
                 return await select_interaction.response.send_message("You can't select a language for this ticket.", ephemeral=True)
-            lang = select.values[0]
-            await select_interaction.response.defer()
-            await create_ticket_channel(interaction, category, additional_info, lang)
-            await select_interaction.followup.send(f"✅ Selected {lang.upper()} - Ticket created!", ephemeral=True)
+            if self.is_finished():
+                return await select_interaction.response.send_message("⏳ Your ticket is already being created.", ephemeral=True)
+            # Stop before the first await so a second click that raced in sees the view finished
             self.stop()
+            lang = select.values[0]
+            select.disabled = True
+            await select_interaction.response.edit_message(view=self)
+            if await create_ticket_channel(interaction, category, additional_info, lang):
+                await select_interaction.followup.send(f"✅ Selected {lang.upper()} - Ticket created!", ephemeral=True)
+                return
+            # Nothing was created, so hand the user a fresh menu instead of making them redo the form
+            try:
+                await select_interaction.edit_original_response(view=LanguageSelect())
+            except Exception as e:
+                logger.error(f"Error re-enabling language select: {e}")
     view = LanguageSelect()
     await interaction.followup.send(embed=embed, view=view, ephemeral=True)
 
+def format_wait(seconds):
+    if seconds < 60:
+        return f"{max(math.ceil(seconds), 1)} second(s)"
+    return f"{math.ceil(seconds / 60)} minute(s)"
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens refilled evenly over `per` seconds"""
+
+    __slots__ = ("rate", "per", "tokens", "updated")
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+        self.updated = now
+
+    def retry_after(self):
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) * self.per / self.rate
+
+    def take(self):
+        if self.retry_after():
+            return False
+        self.tokens -= 1
+        return True
+
+    def give_back(self):
+        """Refund a token taken for work that never happened"""
+        self.tokens = min(self.rate, self.tokens + 1)
+
+class AdmissionDenied(Exception):
+    pass
+
+class AdmissionController:
+    """Open-ticket caps, per-user and global token buckets, and a FIFO overflow queue for ticket creation.
+
+    When the global bucket is empty, requests wait their turn in the queue instead
+    of piling API calls onto Discord's rate limiter.
+    """
+
+    def __init__(self):
+        self.user_buckets = ExpiringDict(ttl=TICKET_USER_RATE[1] if TICKET_USER_RATE else None)
+        self.global_bucket = TokenBucket(*TICKET_GLOBAL_RATE) if TICKET_GLOBAL_RATE else None
+        self.in_flight = {}
+        self.in_flight_categories = {}
+        self.queue = deque()
+        self._pump_task = None
+
+    def check(self, user_id, category):
+        """Reason the user cannot open a ticket right now, or None; consumes nothing"""
+        open_count = open_ticket_index.for_user(user_id) + self.in_flight.get(user_id, 0)
+        if MAX_OPEN_TICKETS_PER_USER and open_count >= MAX_OPEN_TICKETS_PER_USER:
+            return f"You already have {open_count} open tickets. Please close one before opening another."
+        category_count = open_ticket_index.for_category(category) + self.in_flight_categories.get(category, 0)
+        if MAX_OPEN_TICKETS_PER_CATEGORY and category_count >= MAX_OPEN_TICKETS_PER_CATEGORY:
+            return f"Too many {category} tickets are open right now. Please try again later."
+        bucket = self.user_buckets.get(user_id)
+        wait = bucket.retry_after() if bucket else 0
+        if wait:
+            return f"You are opening tickets too quickly. Please try again in {format_wait(wait)}."
+        if len(self.queue) >= TICKET_QUEUE_MAX:
+            return "The ticket system is very busy right now. Please try again in a few minutes."
+        return None
+
+    async def acquire(self, user_id, category, notify=None):
+        """Admit a ticket creation, waiting in the overflow queue if needed; pair with release()"""
+        reason = self.check(user_id, category)
+        if reason:
+            raise AdmissionDenied(reason)
+        self.in_flight[user_id] = self.in_flight.get(user_id, 0) + 1
+        self.in_flight_categories[category] = self.in_flight_categories.get(category, 0) + 1
+        try:
+            if TICKET_USER_RATE:
+                bucket = self.user_buckets.get(user_id)
+                if bucket is None:
+                    bucket = TokenBucket(*TICKET_USER_RATE)
+                bucket.take()
+                self.user_buckets[user_id] = bucket
+            if self.global_bucket is None or (not self.queue and self.global_bucket.take()):
+                return
+            future = asyncio.get_running_loop().create_future()
+            self.queue.append((future, notify))
+            metrics.inc("ticket_admission_queued_total")
+            if notify:
+                asyncio.create_task(notify(len(self.queue), self._eta(len(self.queue))))
+            if self._pump_task is None or self._pump_task.done():
+                self._pump_task = asyncio.create_task(self._pump())
+            await future
+        except BaseException:
+            self.release(user_id, category, refund=True)
+            raise
+
+    def release(self, user_id, category, refund=False):
+        """End an admitted creation; refund=True gives the user's rate token back when no ticket was opened"""
+        if refund:
+            bucket = self.user_buckets.get(user_id)
+            if bucket is not None:
+                bucket.give_back()
+        for counts, key in ((self.in_flight, user_id), (self.in_flight_categories, category)):
+            remaining = counts.get(key, 0) - 1
+            if remaining > 0:
+                counts[key] = remaining
+            else:
+                counts.pop(key, None)
+
+    def _eta(self, position):
+        rate, per = TICKET_GLOBAL_RATE
+        return max(position - self.global_bucket.tokens, 0) * per / rate
+
+    async def _pump(self):
+        last_update = time.monotonic()
+        while self.queue:
+            wait = self.global_bucket.retry_after()
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            future, _ = self.queue.popleft()
+            if future.done():
+                continue
+            self.global_bucket.take()
+            future.set_result(None)
+            if time.monotonic() - last_update >= TICKET_QUEUE_UPDATE_INTERVAL:
+                last_update = time.monotonic()
+                for position, (_, notify) in enumerate(self.queue, start=1):
+                    if notify:
+                        asyncio.create_task(notify(position, self._eta(position)))
+
+admission = AdmissionController()
+expiring_maps["ticket_user_buckets"] = admission.user_buckets
+
+def queue_position_notice(interaction):
+    """Keep one ephemeral message per queued user up to date with their place in line"""
+    message = None
+
+    async def notify(position, eta):
+        nonlocal message
+        content = f"⏳ The ticket system is busy. You are **#{position}** in line (about {format_wait(eta)})."
+        try:
+            if message is None:
+                message = await interaction.followup.send(content, ephemeral=True, wait=True)
+            else:
+                await message.edit(content=content)
+        except Exception as e:
+            logger.warning(f"Could not update queue position for {interaction.user}: {e}")
+
+    return notify
+
+class TicketCreationCoalescer:
+    """Runs one ticket creation per idempotency key.
+
+    Duplicates that arrive while the first creation is in flight await the same
+    task; duplicates that arrive shortly after a successful creation get its
+    result back. Failures are not remembered, so the user can simply try again.
+    """
+
+    def __init__(self, ttl=TICKET_IDEMPOTENCY_TTL):
+        self._in_flight = {}
+        self._completed = ExpiringDict(ttl=ttl)
+
+    async def run(self, key, create):
+        if key in self._completed:
+            metrics.inc("ticket_creation_duplicates_total", state="completed")
+            return self._completed[key]
+        task = self._in_flight.get(key)
+        if task is not None:
+            metrics.inc("ticket_creation_duplicates_total", state="in_flight")
+        else:
+            task = asyncio.ensure_future(create())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # Shielded so a cancelled duplicate never cancels the creation everyone else is waiting on
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        self._in_flight.pop(key, None)
+        if not task.cancelled() and task.exception() is None and task.result() is not None:
+            self._completed[key] = task.result()
+
+ticket_creations = TicketCreationCoalescer()
+expiring_maps["ticket_creations"] = ticket_creations._completed
+
+class ChannelPool:
+    """Hidden, pre-created channels per ticket category, so opening a ticket costs one channel edit.
+
+    Idle channels are named with CHANNEL_POOL_PREFIX and only visible to the bot;
+    they are adopted back after a restart and topped up in the background.
+    """
+
+    def __init__(self, size=CHANNEL_POOL_SIZE):
+        self.size = size
+        self._idle = {}
+        self._idle_ids = set()
+        self._refill_tasks = {}
+        self._guild = None
+
+    def __contains__(self, channel_id):
+        return channel_id in self._idle_ids
+
+    @property
+    def idle_count(self):
+        return len(self._idle_ids)
+
+    def available(self, category_id):
+        return len(self._idle.get(category_id, ()))
+
+    def _add(self, category_id, channel):
+        self._idle.setdefault(category_id, deque()).append(channel)
+        self._idle_ids.add(channel.id)
+
+    def adopt(self, guild):
+        """Pick up idle pool channels left over from a previous run"""
+        if not self.size:
+            return
+        self._guild = guild
+        for channel in guild.text_channels:
+            if (channel.category_id in TICKET_CATEGORY_IDS and channel.name.startswith(CHANNEL_POOL_PREFIX)
+                    and channel.id not in self._idle_ids):
+                self._add(channel.category_id, channel)
+
+    def start(self):
+        for category_id in TICKET_CATEGORY_IDS:
+            self._schedule_refill(category_id)
+
+    def _schedule_refill(self, category_id):
+        if not self.size or self._guild is None:
+            return
+        task = self._refill_tasks.get(category_id)
+        if task is None or task.done():
+            self._refill_tasks[category_id] = asyncio.create_task(self._refill(category_id))
+
+    async def _refill(self, category_id):
+        category_channel = discord.utils.get(self._guild.categories, id=category_id)
+        if category_channel is None:
+            logger.error(f"Ticket category {category_id} not found, channel pool disabled for it")
+            return
+        while self.available(category_id) < self.size:
+            suffix = "".join(random.choices(string.ascii_lowercase + string.digits, k=6))
+            try:
+                channel = await self._guild.create_text_channel(
+                    name=f"{CHANNEL_POOL_PREFIX}{suffix}",
+                    category=category_channel,
+                    overwrites={self._guild.default_role: discord.PermissionOverwrite(read_messages=False)}
+                )
+            except Exception as e:
+                # The next handoff schedules another attempt
+                logger.error(f"Error refilling channel pool: {e}")
+                return
+            self._add(category_id, channel)
+            # Spread creations out so refills never compete with live ticket traffic for the bucket
+            await asyncio.sleep(CHANNEL_POOL_REFILL_DELAY)
+
+    async def acquire(self, category_id, name, overwrites):
+        """Rename an idle channel and open it up for the ticket; None if the pool is empty"""
+        idle = self._idle.get(category_id)
+        channel = None
+        while idle and channel is None:
+            candidate = idle.popleft()
+            self._idle_ids.discard(candidate.id)
+            try:
+                await candidate.edit(name=name, overwrites=overwrites)
+                channel = candidate
+            except NotFound:
+                continue
+            except HTTPException as e:
+                logger.warning(f"Could not hand off pooled channel {candidate.name}: {e}")
+                self._add(category_id, candidate)
+                break
+        self._schedule_refill(category_id)
+        if channel is not None:
+            rename_scheduler.note_rename(channel.id)
+        return channel
+
+    def discard(self, channel_id):
+        """Forget an idle channel deleted from outside the bot"""
+        if channel_id not in self._idle_ids:
+            return
+        self._idle_ids.discard(channel_id)
+        for category_id, idle in self._idle.items():
+            for channel in idle:
+                if channel.id == channel_id:
+                    idle.remove(channel)
+                    self._schedule_refill(category_id)
+                    return
+
+channel_pool = ChannelPool()
+
 async def create_ticket_channel(interaction, category, additional_info, lang="en"):
+    """Create the ticket for an interaction once, however many times it is submitted.
+
+    The key is the interaction that carried the form, so a double click or a
+    redelivered interaction resolves to the same channel.
+    """
+    return await ticket_creations.run(
+        interaction.id, lambda: _create_ticket_channel(interaction, category, additional_info, lang)
+    )
+
+@metrics.timed("ticket_handler_seconds", handler="create_ticket_channel")
+async def _create_ticket_channel(interaction, category, additional_info, lang):
+    try:
+        await admission.acquire(interaction.user.id, category, queue_position_notice(interaction))
+    except AdmissionDenied as e:
+        metrics.inc("ticket_admission_denied_total")
+        await interaction.followup.send(f"🚫 {e}", ephemeral=True)
+        return None
+    opened = False
+    ticket_channel = None
     try:
         config = TICKET_CATEGORIES[category]
         guild = interaction.guild
 
-        ticket_number = get_next_ticket_number(category)
+        ticket_number = await reserve_ticket_number(category)
         channel_name = f"{category.split()[1].lower()}-{ticket_number}"
 
         overwrites = {
@@ -514,23 +2518,33 @@ async def create_ticket_channel(interaction, category, additional_info, lang="en
             if lang_role:
                 overwrites[lang_role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
 
-        category_channel = discord.utils.get(guild.categories, id=config["id"])
-        ticket_channel = await guild.create_text_channel(
-            name=channel_name,
-            category=category_channel,
-            overwrites=overwrites
-        )
+        ticket_channel = await channel_pool.acquire(config["id"], channel_name, overwrites)
+        if ticket_channel is None:
+            category_channel = discord.utils.get(guild.categories, id=config["id"])
+            ticket_channel = await guild.create_text_channel(
+                name=channel_name,
+                category=category_channel,
+                overwrites=overwrites
+            )
+        transcript_journal.begin(ticket_channel.id)
+        transcript_journal_writer.notify()
+        inactivity_scheduler.touch(ticket_channel.id)
 
         unique_id = generate_unique_ticket_id()
 
-        ticket_data[ticket_channel.id] = {
-            "user_id": interaction.user.id,
-            "claimed_by": None,
-            "language": lang,
-            "additional_info": additional_info,
-            "category": category,
-            "unique_id": unique_id
-        }
+        record = TicketRecord(
+            ticket_channel.id,
+            user_id=interaction.user.id,
+            language=lang,
+            additional_info=additional_info,
+            category=category,
+            unique_id=unique_id
+        )
+        ticket_state.open_ticket(record)
+        opened = True
+        # From here on the open-ticket index counts it
+        admission.release(interaction.user.id, category)
+        append_ticket_log(record.to_log_entry(channel_name))
 
         if category in ["📋 Staff Application"]:
             staff_role = guild.get_role(CLAIM_ROLE_ID)
@@ -562,9 +2576,10 @@ async def create_ticket_channel(interaction, category, additional_info, lang="en
             color=config["color"],
             timestamp=datetime.now(UTC)
         )
-        embed.set_thumbnail(url=interaction.guild.icon.url)
+        if interaction.guild.icon:
+            embed.set_thumbnail(url=interaction.guild.icon.url)
         embed.set_image(url="htts://example.com/image.png")
-        embed.set_footer(text=f"🎟️ Opened by {interaction.user.name}", icon_url=interaction.user.avatar.url)
+        embed.set_footer(text=f"🎟️ Opened by {interaction.user.name}", icon_url=interaction.user.display_avatar.url)
 
         # Add ticket ID to embed
         embed.add_field(
@@ -587,22 +2602,6 @@ async def create_ticket_channel(interaction, category, additional_info, lang="en
             embed=embed,
             view=view
         )
-        log_entry = {
-            "channel_name": channel_name,
-            "category": category,
-            "opened_by": interaction.user.id,
-            "claimed_by": None,
-            "renames": [],
-            "opened_at": datetime.now(UTC).isoformat(),
-            "closed_at": None,
-            "duration": None,
-            "language": lang,
-            "staff_messages": 0,
-            "claimers": [],
-            "closer": None,
-            "unique_id": unique_id
-        }
-        append_ticket_log(log_entry)
 
         try:
             await interaction.followup.send(
@@ -615,9 +2614,30 @@ async def create_ticket_channel(interaction, category, additional_info, lang="en
                 await interaction.user.send(f"🎟️ Your {category} ticket was created: {ticket_channel.mention}")
             except Exception as e:
                 logger.error(f"Failed to DM user about ticket: {e}")
+        return ticket_channel
 
     except Exception as e:
         logger.error(f"Error creating ticket: {e}")
+        if opened:
+            # The channel and its record already exist: finish it with plain controls, a retry would only make another
+            try:
+                await ticket_channel.send(
+                    f"🎟️ {interaction.user.mention} your {category} ticket is open. Ticket ID: `{record.unique_id}`",
+                    view=TicketControls(interaction.user)
+                )
+                await interaction.followup.send(
+                    content=f"🎟️ {category} ticket created: {ticket_channel.mention}",
+                    ephemeral=True
+                )
+            except Exception as e:
+                logger.error(f"Error finishing ticket {ticket_channel.name}: {e}")
+            return ticket_channel
+        if ticket_channel is not None:
+            # Created but never opened: remove it so the retry offered below doesn't leave an orphan
+            try:
+                await ticket_channel.delete()
+            except Exception as e:
+                logger.error(f"Error deleting unopened ticket channel {ticket_channel.name}: {e}")
         try:
             await interaction.followup.send(
                 "❌ An error occurred while creating the ticket. Please try again.",
@@ -629,134 +2649,524 @@ async def create_ticket_channel(interaction, category, additional_info, lang="en
                 await interaction.user.send("❌ An error occurred while creating your ticket. Please try again.")
             except Exception as e:
                 logger.error(f"Failed to DM user about error: {e}")
+        return None
+    finally:
+        if not opened:
+            admission.release(interaction.user.id, category, refund=True)
+
+def format_log_time(value):
+    return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+
+def build_staff_embed(log_entry):
+    opened_by = log_entry.get("opened_by")
+    claimed_by = log_entry.get("claimed_by")
+    language_display = "English 🇬🇧" if log_entry.get("language", "en") == "en" else "Italian 🇮🇹"
+    first_response = log_entry.get("first_response")
+    first_response_display = str(timedelta(seconds=int(first_response))) if first_response is not None else "No staff response"
+
+    if log_entry.get("claimers"):
+        claimers_info = "\n".join(
+            f"- <@{uid}> at {format_log_time(dt)}" for uid, dt in log_entry["claimers"]
+        )
+    else:
+        claimers_info = "No staff claimed this ticket."
+
+    if log_entry.get("renames"):
+        renames_info = "\n".join(
+            f"- `{old}` ➔ `{new}` by <@{uid}> at {format_log_time(dt)}"
+            for old, new, uid, dt in log_entry["renames"]
+        )
+    else:
+        renames_info = "No renames performed."
 
+    staff_embed = discord.Embed(
+        title="📜 **Ticket Transcript**",
+        description=(
+            "📄 Here is the complete transcript of the ticket. Below you will find all the details about the ticket, "
+            "including who opened it, who closed it, and how long it was active.\n\n"
+            "**📋 Ticket Details:**\n"
+            f"• **👤 Opened By:** {f'<@{opened_by}>' if opened_by else 'Unknown'}\n"
+            f"• **🛠️ Claimed By:** {f'<@{claimed_by}>' if claimed_by else 'Not Claimed'}\n"
+            f"• **🔒 Closed By:** <@{log_entry.get('closer')}>\n"
+            f"• **📅 Opened At:** {format_log_time(log_entry['opened_at'])}\n"
+            f"• **⏰ Closed At:** {format_log_time(log_entry['closed_at'])}\n"
+            f"• **⌛ Duration:** {log_entry.get('duration')}\n"
+            f"• **🌐 Language:** {language_display}\n"
+            f"• **👥 Staff Messages:** {log_entry.get('staff_messages', 0)}\n"
+            f"• **⏱️ First Response:** {first_response_display}\n"
+            f"• **📝 Claimers:**\n{claimers_info}\n"
+            f"• **✏️ Renames:**\n{renames_info}\n"
+        ),
+        color=discord.Color.blurple(),
+        timestamp=datetime.fromisoformat(log_entry["closed_at"])
+    )
+    staff_embed.set_footer(text="Ticket System")
+    staff_embed.add_field(name="Transcript", value="See attached file.", inline=False)
+    return staff_embed
+
+@metrics.timed("ticket_handler_seconds", handler="save_transcript")
 async def save_transcript(channel, closer):
+    """Snapshot a closing ticket and queue its transcript for delivery; the channel can be deleted right after"""
     try:
-        transcript_content = await generate_transcript(channel)
-        transcript_channel = bot.get_channel(TRANSCRIPT_CHANNEL_ID)
-        if not transcript_channel:
-            logger.error("Transcript channel not found")
-            return
-        staff_messages = 0
-        async for message in channel.history(limit=None):
-            if hasattr(message.author, "roles") and any(role.id == CLAIM_ROLE_ID for role in getattr(message.author, "roles", [])):
-                staff_messages += 1
+        record = tickets.get(channel.id)
+        # Pooled channels are created well before the ticket opens
+        opened_at = record.opened_at if record else channel.created_at.replace(tzinfo=UTC)
+        staff_counter = StaffMessageCounter()
+        try:
+            transcript, staff_messages, author_messages, first_response = await run_history_pipeline(
+                channel, [TranscriptFile(), staff_counter, AuthorStats(), FirstResponseTimer(opened_at)]
+            )
+        except Exception as e:
+            logger.error(f"Error generating transcript: {e}")
+            transcript = TranscriptFile()
+            transcript.write_line("Error generating transcript")
+            transcript.result()
+            staff_messages, author_messages, first_response = 0, {}, None
 
-        opened_at = channel.created_at.replace(tzinfo=UTC)
         closed_at = datetime.now(UTC)
         duration = closed_at - opened_at
+        record = record or TicketRecord(channel.id)
+        log_entry = record.to_log_entry(
+            channel.name,
+            opened_at=opened_at.isoformat(),
+            closed_at=closed_at.isoformat(),
+            duration=str(duration).split('.')[0],
+            duration_seconds=duration.total_seconds(),
+            staff_messages=staff_messages,
+            staff_author_messages={str(uid): count for uid, count in staff_counter.by_author.items()},
+            first_response=first_response.total_seconds() if first_response is not None else None,
+            author_messages={str(uid): count for uid, count in author_messages.items()},
+            closer=getattr(closer, "id", str(closer))
+        )
+        try:
+            await transcript_delivery.submit(log_entry, transcript)
+        finally:
+            transcript.close()
+        append_ticket_log(log_entry)
+        ticket_stats.add(log_entry)
+        ticket_stats_writer.notify()
+        # Closed first: a message that lands before the channel is gone may recreate the journal,
+        # and the delete event must not finalize the ticket a second time from it
+        ticket_state.close_ticket(channel.id)
+        await asyncio.to_thread(transcript_journal.discard, channel.id)
+    except Exception as e:
+        logger.error(f"Error creating ticket transcript: {e}")
+        raise
 
-        ticket_info = ticket_data.get(channel.id, {})
-        opener_id = ticket_info.get("user_id")
-        opener = bot.get_user(opener_id)
-        opener_tag = opener.mention if opener else "Unknown"
+class TranscriptDeliveryQueue:
+    """Durable job queue that uploads transcripts and DMs openers from a pool of workers.
 
-        claimed_by = ticket_info.get("claimed_by")
-        claimed_by_user = bot.get_user(claimed_by) if claimed_by else None
-        claimed_by_tag = claimed_by_user.mention if claimed_by_user else "Not Claimed"
+    Each job is a directory holding job.json and the transcript file, so pending
+    deliveries survive restarts and are removed only once fully delivered.
+    """
 
-        language = ticket_info.get("language", "en")
-        language_display = "English 🇬🇧" if language == "en" else "Italian 🇮🇹"
+    def __init__(self, directory, workers=TRANSCRIPT_DELIVERY_WORKERS):
+        self.directory = directory
+        self.workers = workers
+        self._queue = None
+        self._tasks = []
 
-        claimers_info = ""
-        if channel.id in ticket_claimers and ticket_claimers[channel.id]:
-            claimers_info = "\n".join(
-                f"- <@{uid}> at {dt.strftime('%Y-%m-%d %H:%M:%S')}" for uid, dt in ticket_claimers[channel.id]
-            )
-        else:
-            claimers_info = "No staff claimed this ticket."
+    def _job_dir(self, job_id):
+        return os.path.join(self.directory, job_id)
 
-        renames_info = ""
-        if channel.id in ticket_renames and ticket_renames[channel.id]:
-            renames_info = "\n".join(
-                f"- `{old}` ➔ `{new}` by <@{uid}> at {dt.strftime('%Y-%m-%d %H:%M:%S')}"
-                for old, new, uid, dt in ticket_renames[channel.id]
-            )
-        else:
-            renames_info = "No renames performed."
-
-        staff_embed = discord.Embed(
-            title="📜 **Ticket Transcript**",
-            description=(
-                "📄 Here is the complete transcript of the ticket. Below you will find all the details about the ticket, "
-                "including who opened it, who closed it, and how long it was active.\n\n"
-                "**📋 Ticket Details:**\n"
-                f"• **👤 Opened By:** {opener_tag}\n"
-                f"• **🛠️ Claimed By:** {claimed_by_tag}\n"
-                f"• **🔒 Closed By:** {closer.mention}\n"
-                f"• **📅 Opened At:** {opened_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                f"• **⏰ Closed At:** {closed_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                f"• **⌛ Duration:** {str(duration).split('.')[0]}\n"
-                f"• **🌐 Language:** {language_display}\n"
-                f"• **👥 Staff Messages:** {staff_messages}\n"
-                f"• **📝 Claimers:**\n{claimers_info}\n"
-                f"• **✏️ Renames:**\n{renames_info}\n"
-            ),
-            color=discord.Color.blurple(),
-            timestamp=closed_at
-        )
-        staff_embed.set_footer(text="Ticket System")
-        staff_embed.add_field(name="Transcript", value="See attached file.", inline=False)
-
-        transcript_file = discord.File(io.StringIO(transcript_content), filename=f"{channel.name}_transcript.txt")
-        await transcript_channel.send(embed=staff_embed, file=transcript_file)
-        if opener:
-            await send_transcript_to_user(opener, transcript_content, channel.name, ticket_info, staff_embed)
-
-        def convert(obj):
-            if isinstance(obj, datetime):
-                return obj.isoformat()
-            if isinstance(obj, list):
-                return [convert(i) for i in obj]
-            if isinstance(obj, dict):
-                return {k: convert(v) for k, v in obj.items()}
-            return obj
-        log_entry = {
-            "channel_name": channel.name,
-            "category": ticket_info.get("category", "Unknown"),
-            "opened_by": opener_id,
-            "claimed_by": claimed_by,
-            "renames": convert(ticket_renames.get(channel.id, [])),
-            "opened_at": opened_at.isoformat(),
-            "closed_at": closed_at.isoformat(),
-            "duration": str(duration).split('.')[0],
-            "language": language,
-            "staff_messages": staff_messages,
-            "claimers": convert(ticket_claimers.get(channel.id, [])),
-            "closer": getattr(closer, "id", str(closer)),
-            "unique_id": ticket_info.get("unique_id", "Unknown")
+    def _write_job(self, job):
+        job_file = os.path.join(self._job_dir(job["job_id"]), "job.json")
+        temp_file = f"{job_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(job, f, default=str)
+        os.replace(temp_file, job_file)
+
+    def _store_job(self, job, transcript):
+        job_dir = self._job_dir(job["job_id"])
+        os.makedirs(job_dir, exist_ok=True)
+        transcript.buffer.seek(0)
+        with open(os.path.join(job_dir, job["transcript_file"]), "wb") as f:
+            shutil.copyfileobj(transcript.buffer, f)
+        self._write_job(job)
+
+    def _load_jobs(self):
+        jobs = []
+        if not os.path.isdir(self.directory):
+            return jobs
+        for job_id in sorted(os.listdir(self.directory)):
+            try:
+                with open(os.path.join(self._job_dir(job_id), "job.json"), "r", encoding="utf-8") as f:
+                    job = json.load(f)
+                job["attempts"] = 0
+                jobs.append(job)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.error(f"Skipping unreadable transcript job {job_id}: {e}")
+        return jobs
+
+    def _remove_job(self, job_id):
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+    @property
+    def depth(self):
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self):
+        """Start the workers and resume jobs left over from a previous run"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        for job in await asyncio.to_thread(self._load_jobs):
+            self._queue.put_nowait(job)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, log_entry, transcript):
+        job = {
+            "job_id": f"{int(time.time() * 1000)}-{log_entry['unique_id']}",
+            "log_entry": log_entry,
+            "transcript_file": "transcript.txt.gz" if transcript.compressed else "transcript.txt",
+            "compressed": transcript.compressed,
+            "staff_sent": False,
+            "user_sent": False,
+            "attempts": 0
         }
-        append_ticket_log(log_entry)
-    except Exception as e:
-        logger.error(f"Error creating ticket transcript: {e}")
+        await asyncio.to_thread(self._store_job, job, transcript)
+        if self._queue is not None:
+            self._queue.put_nowait(job)
+        return job
+
+    def _retry_later(self, job):
+        delay = min(TRANSCRIPT_DELIVERY_BACKOFF * 2 ** (job["attempts"] - 1), TRANSCRIPT_DELIVERY_MAX_BACKOFF)
+        asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job)
+        metrics.inc("transcript_delivery_retries_total")
+        logger.warning(f"Retrying transcript job {job['job_id']} in {delay}s (attempt {job['attempts']})")
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._deliver(job)
+                await asyncio.to_thread(self._remove_job, job["job_id"])
+            except Exception as e:
+                job["attempts"] += 1
+                logger.error(f"Error delivering transcript job {job['job_id']}: {e}")
+                await asyncio.to_thread(self._write_job, job)
+                if job["attempts"] < TRANSCRIPT_DELIVERY_MAX_ATTEMPTS:
+                    self._retry_later(job)
+                else:
+                    logger.error(f"Giving up on transcript job {job['job_id']} until next restart")
+            finally:
+                self._queue.task_done()
+
+    @metrics.timed("background_task_seconds", task="transcript_delivery")
+    async def _deliver(self, job):
+        log_entry = job["log_entry"]
+        channel_name = log_entry["channel_name"]
+        path = os.path.join(self._job_dir(job["job_id"]), job["transcript_file"])
+        staff_embed = build_staff_embed(log_entry)
+
+        if not job.get("indexed"):
+            try:
+                await asyncio.to_thread(transcript_index.add_file, log_entry, path, job["compressed"])
+            except Exception as e:
+                logger.error(f"Error indexing transcript {channel_name}: {e}")
+            job["indexed"] = True
+            await asyncio.to_thread(self._write_job, job)
+
+        if not job["staff_sent"]:
+            transcript_channel = bot.get_channel(TRANSCRIPT_CHANNEL_ID)
+            if not transcript_channel:
+                raise RuntimeError("Transcript channel not found")
+            transcript = TranscriptFile.from_path(path, job["compressed"])
+            try:
+                await send_transcript_files(
+                    transcript_channel, transcript, channel_name, transcript_channel.guild.filesize_limit, embed=staff_embed
+                )
+            finally:
+                transcript.close()
+            job["staff_sent"] = True
+            await asyncio.to_thread(self._write_job, job)
+
+        if not job["user_sent"]:
+            opener_id = log_entry.get("opened_by")
+            opener = await resolve_user(opener_id) if opener_id else None
+            if opener:
+                transcript = TranscriptFile.from_path(path, job["compressed"])
+                try:
+                    await send_transcript_to_user(opener, transcript, channel_name, log_entry, staff_embed)
+                except Forbidden as e:
+                    logger.warning(f"Cannot DM transcript to {opener}: {e}")
+                finally:
+                    transcript.close()
+            job["user_sent"] = True
+
+transcript_delivery = TranscriptDeliveryQueue(TRANSCRIPT_QUEUE_DIR)
+
+def is_staff_member(member):
+    return any(role.id == CLAIM_ROLE_ID for role in getattr(member, "roles", []))
+
+class StaffMessageCounter:
+    """Counts messages sent by members with the staff role, in total and per staff member"""
+
+    def __init__(self):
+        self.count = 0
+        self.by_author = {}
+
+    def feed(self, message):
+        if is_staff_member(message.author):
+            self.count += 1
+            if not message.author.bot:
+                self.by_author[message.author.id] = self.by_author.get(message.author.id, 0) + 1
 
-async def generate_transcript(channel):
+    def result(self):
+        return self.count
+
+class AuthorStats:
+    """Per-author message counts keyed by user ID"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def feed(self, message):
+        author_id = message.author.id
+        self.counts[author_id] = self.counts.get(author_id, 0) + 1
+
+    def result(self):
+        return self.counts
+
+class FirstResponseTimer:
+    """Time from the ticket opening to the first staff message"""
+
+    def __init__(self, opened_at):
+        self.opened_at = opened_at
+        self.first_response_at = None
+
+    def feed(self, message):
+        if self.first_response_at is None and not message.author.bot and is_staff_member(message.author):
+            self.first_response_at = message.created_at
+
+    def result(self):
+        if self.first_response_at is None:
+            return None
+        return self.first_response_at - self.opened_at
+
+class TranscriptFile:
+    """Streams transcript lines into a spooled temp file, optionally gzip-compressed"""
+
+    def __init__(self, compress=TRANSCRIPT_GZIP):
+        self.buffer = tempfile.SpooledTemporaryFile(max_size=TRANSCRIPT_SPOOL_SIZE)
+        self.compressed = compress
+        self._writer = gzip.GzipFile(fileobj=self.buffer, mode="wb") if compress else self.buffer
+        self._empty = True
+
+    def write_line(self, line):
+        data = line.encode("utf-8")
+        self._writer.write(data if self._empty else b"\n" + data)
+        self._empty = False
+
+    def feed(self, message):
+        timestamp = message.created_at.strftime("[%Y-%m-%d %H:%M:%S]")
+        content = message.content or "[No text content]"
+        self.write_line(f"{timestamp} {message.author.name}: {content}")
+
+    def result(self):
+        if self.compressed and not self._writer.closed:
+            self._writer.close()
+        return self
+
+    @classmethod
+    def from_path(cls, path, compressed=False):
+        """Reopen a transcript previously written to disk"""
+        transcript = cls.__new__(cls)
+        transcript.buffer = transcript._writer = open(path, "rb")
+        transcript.compressed = compressed
+        transcript._empty = False
+        return transcript
+
+    @property
+    def size(self):
+        return self.buffer.seek(0, io.SEEK_END)
+
+    def compress(self):
+        if self.compressed:
+            return
+        compressed = tempfile.SpooledTemporaryFile(max_size=TRANSCRIPT_SPOOL_SIZE)
+        self.buffer.seek(0)
+        with gzip.GzipFile(fileobj=compressed, mode="wb") as writer:
+            shutil.copyfileobj(self.buffer, writer)
+        self.buffer.close()
+        self.buffer = self._writer = compressed
+        self.compressed = True
+
+    def files(self, channel_name, limit):
+        """Build upload files, compressing and then splitting into parts to fit the size limit"""
+        if self.size > limit:
+            self.compress()
+        filename = f"{channel_name}_transcript.txt" + (".gz" if self.compressed else "")
+        size = self.size
+        self.buffer.seek(0)
+        if size <= limit:
+            return [discord.File(self.buffer, filename=filename)]
+        parts = []
+        for index in range(math.ceil(size / limit)):
+            part = tempfile.SpooledTemporaryFile(max_size=TRANSCRIPT_SPOOL_SIZE)
+            remaining = limit
+            while remaining:
+                chunk = self.buffer.read(min(remaining, 64 * 1024))
+                if not chunk:
+                    break
+                part.write(chunk)
+                remaining -= len(chunk)
+            part.seek(0)
+            parts.append(discord.File(part, filename=f"{filename}.part{index + 1:03d}"))
+        return parts
+
+    def close(self):
+        self.buffer.close()
+
+async def send_transcript_files(destination, transcript, channel_name, limit, **kwargs):
+    """Send the transcript as attachments, 10 per message, with kwargs on the first message"""
+    files = transcript.files(channel_name, limit)
     try:
-        transcript = []
+        for start in range(0, len(files), 10):
+            await destination.send(files=files[start:start + 10], **(kwargs if start == 0 else {}))
+    finally:
+        for file in files:
+            if file.fp is not transcript.buffer:
+                file.fp.close()
+
+async def iter_ticket_messages(channel):
+    """Yield the ticket's messages oldest first, from the live journal when possible"""
+    records = await asyncio.to_thread(transcript_journal.read, channel.id)
+    if records is None:
         async for message in channel.history(limit=None, oldest_first=True):
-            timestamp = message.created_at.strftime("[%Y-%m-%d %H:%M:%S]")
-            content = message.content or "[No text content]"
-            transcript.append(f"{timestamp} {message.author.name}: {content}")
-        return "\n".join(transcript)
-    except Exception as e:
-        logger.error(f"Error generating transcript: {e}")
-        return "Error generating transcript"
+            yield await with_member_author(message, channel.guild)
+        return
+
+    last_id = 0
+    for record in records:
+        last_id = record["id"]
+        yield JournalMessage(record)
+    try:
+        # Pick up anything sent while the journal was not being written
+        after = discord.Object(id=last_id) if last_id else None
+        async for message in channel.history(limit=None, after=after, oldest_first=True):
+            if message.id > last_id:
+                yield await with_member_author(message, channel.guild)
+    except (NotFound, Forbidden) as e:
+        logger.warning(f"Transcript for {channel.name} built from journal only: {e}")
+
+async def backfill_transcript_journal(channel):
+    """Append messages missed while the bot was offline to an open ticket's journal"""
+    records = await asyncio.to_thread(transcript_journal.read, channel.id)
+    if records is None:
+        return
+    seen = {record["id"] for record in records}
+    after = discord.Object(id=records[-1]["id"]) if records else None
+    async for message in channel.history(limit=None, after=after, oldest_first=True):
+        if message.id not in seen:
+            transcript_journal.record(await with_member_author(message, channel.guild))
+    transcript_journal_writer.notify()
+
+async def run_history_pipeline(channel, consumers):
+    """Stream the ticket's messages once, oldest first, through every consumer"""
+    async for message in iter_ticket_messages(channel):
+        for consumer in consumers:
+            consumer.feed(message)
+    return [consumer.result() for consumer in consumers]
+
+class InactivityScheduler:
+    """Last-activity index plus a min-heap of inactivity deadlines for open tickets"""
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.last_activity = {}
+        self._heap = []
+        self._wakeup = None
+        self._task = None
+
+    def touch(self, channel_id, when=None):
+        when = when if when is not None else time.time()
+        known = channel_id in self.last_activity
+        if known and when <= self.last_activity[channel_id]:
+            return
+        self.last_activity[channel_id] = when
+        # Activity only ever pushes a deadline later, so existing heap entries are fixed up lazily
+        if not known:
+            heapq.heappush(self._heap, (when + self.timeout, channel_id))
+            if self._wakeup:
+                self._wakeup.set()
+
+    def forget(self, channel_id):
+        self.last_activity.pop(channel_id, None)
+
+    def pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, channel_id = heapq.heappop(self._heap)
+            last_activity = self.last_activity.get(channel_id)
+            if last_activity is None:
+                continue
+            if last_activity + self.timeout > now:
+                heapq.heappush(self._heap, (last_activity + self.timeout, channel_id))
+                continue
+            self.forget(channel_id)
+            due.append(channel_id)
+        return due
+
+    def next_deadline(self):
+        return self._heap[0][0] if self._heap else None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await check_inactive_tickets()
+            except Exception as e:
+                logger.error(f"Error checking inactive tickets: {e}")
+            self._wakeup.clear()
+            deadline = self.next_deadline()
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(),
+                    timeout=max(deadline - time.time(), 0) if deadline is not None else None
+                )
+            except asyncio.TimeoutError:
+                pass
+
+inactivity_scheduler = InactivityScheduler(INACTIVE_TIMEOUT * 3600)
+inactive_close_semaphore = asyncio.Semaphore(INACTIVE_CLOSE_CONCURRENCY)
+
+async def close_inactive_ticket(channel_id):
+    async with inactive_close_semaphore:
+        channel = bot.get_channel(channel_id)
+        if channel is None:
+            return
+        await channel.send("🔒 This ticket is being closed due to inactivity.")
+        try:
+            await save_transcript(channel, bot.user)
+            await channel.delete()
+        except Exception as e:
+            logger.error(f"Error closing inactive ticket: {e}")
 
-@tasks.loop(hours=1)
+@metrics.timed("ticket_handler_seconds", handler="check_inactive_tickets")
 async def check_inactive_tickets():
-    guild = bot.get_guild(GUILD_ID)
-    for channel in guild.text_channels:
-        if channel.category and channel.category.name in [c.split(' ', 1)[1] for c in TICKET_CATEGORIES]:
-            last_message = await channel.history(limit=1).flatten()
-            if last_message:
-                last_message_time = last_message[0].created_at
-                if (datetime.now(UTC) - last_message_time).total_seconds() > INACTIVE_TIMEOUT * 3600:
-                    await channel.send("🔒 This ticket is being closed due to inactivity.")
-                    try:
-                        await save_transcript(channel, bot.user)
-                        await channel.delete()
-                    except Exception as e:
-                        logger.error(f"Error closing inactive ticket: {e}")
+    """Close every ticket whose inactivity deadline has passed"""
+    due = inactivity_scheduler.pop_due(time.time())
+    if due:
+        await asyncio.gather(*(close_inactive_ticket(channel_id) for channel_id in due), return_exceptions=True)
+
+def seed_ticket_activity(channel):
+    """Seed the activity index from gateway data without any REST call"""
+    if channel.last_message_id:
+        last_activity = discord.utils.snowflake_time(channel.last_message_id)
+    else:
+        last_activity = channel.created_at
+    inactivity_scheduler.touch(channel.id, last_activity.timestamp())
 
 @bot.event
 async def on_voice_state_update(member, before, after):
@@ -770,6 +3180,151 @@ async def on_voice_state_update(member, before, after):
         if member.id in notified_users:
             notified_users.remove(member.id)
 
+def register_gauges():
+    metrics.gauge("tickets_open", lambda: len(tickets), "Open tickets tracked in memory")
+    metrics.gauge("transcript_delivery_queue_depth", lambda: transcript_delivery.depth, "Transcript jobs waiting for a worker")
+    metrics.gauge("ticket_log_pending_writes", lambda: ticket_log_store.pending_count, "Ticket log entries not yet flushed")
+    metrics.gauge("ticket_state_pending_writes", lambda: ticket_state.pending_count, "State WAL operations not yet flushed")
+    metrics.gauge("inactivity_tracked_tickets", lambda: len(inactivity_scheduler.last_activity), "Tickets with an inactivity deadline")
+    metrics.gauge("ticket_admission_queue_depth", lambda: len(admission.queue), "Ticket creations waiting for admission")
+    metrics.gauge("channel_pool_idle", lambda: channel_pool.idle_count, "Pre-created channels ready for new tickets")
+    metrics.gauge("channel_renames_queued", lambda: rename_scheduler.queued_count, "Renames waiting for the rate limit")
+
+def cleanup_ticket(channel_id):
+    """Drop every piece of per-ticket state once the ticket channel is gone"""
+    inactivity_scheduler.forget(channel_id)
+    rename_scheduler.forget(channel_id)
+    ticket_state.close_ticket(channel_id)
+
+@metrics.timed("background_task_seconds", task="sweep_expiring_maps")
+async def evict_expiring_maps():
+    for name, mapping in expiring_maps.items():
+        evicted = mapping.evict_expired()
+        if evicted:
+            logger.debug(f"Evicted {evicted} expired entries from {name} ({mapping.stats()})")
+
+async def sweep_expiring_maps():
+    rotated_month = datetime.now(UTC).strftime("%Y-%m")
+    while True:
+        await asyncio.sleep(STATE_SWEEP_INTERVAL)
+        await evict_expiring_maps()
+        if datetime.now(UTC).strftime("%Y-%m") != rotated_month:
+            try:
+                await asyncio.to_thread(rotate_ticket_log)
+                rotated_month = datetime.now(UTC).strftime("%Y-%m")
+            except Exception as e:
+                logger.error(f"Error archiving ticket log: {e}")
+
+@bot.listen("on_message")
+async def track_ticket_message(message):
+    if is_ticket_channel(message.channel):
+        transcript_journal.record(message)
+        transcript_journal_writer.notify()
+        inactivity_scheduler.touch(message.channel.id, message.created_at.timestamp())
+
+@bot.listen("on_message_edit")
+async def journal_ticket_message_edit(before, after):
+    if is_ticket_channel(after.channel):
+        transcript_journal.record(after)
+        transcript_journal_writer.notify()
+
+@bot.listen("on_interaction")
+async def count_profiled_interaction(interaction):
+    if profiling_session is not None:
+        profiling_session.count_interaction(interaction)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    if channel.id in channel_pool:
+        return channel_pool.discard(channel.id)
+    # A ticket deleted by hand still gets its transcript from the journal
+    try:
+        if is_ticket_channel(channel) and channel.id in tickets and await asyncio.to_thread(transcript_journal.is_complete, channel.id):
+            await save_transcript(channel, bot.user)
+        else:
+            await asyncio.to_thread(transcript_journal.discard, channel.id)
+    finally:
+        cleanup_ticket(channel.id)
+
+def command_tree_fingerprint(tree, guild=None):
+    """Hash of the serialized app command payload that a sync would upload"""
+    payload = []
+    for command in tree.get_commands(guild=guild):
+        try:
+            payload.append(command.to_dict(tree))
+        except TypeError:
+            payload.append(command.to_dict())
+    encoded = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def load_command_sync_state():
+    try:
+        with open(COMMAND_SYNC_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_command_sync_state(state):
+    temp_file = f"{COMMAND_SYNC_FILE}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=4)
+    os.replace(temp_file, COMMAND_SYNC_FILE)
+
+async def sync_command_tree(force=False):
+    """Sync app commands only when the command tree changed since the last sync"""
+    guild = discord.Object(id=GUILD_ID) if SYNC_COMMANDS_TO_GUILD else None
+    if guild:
+        bot.tree.copy_global_to(guild=guild)
+    scope = f"guild:{GUILD_ID}" if guild else "global"
+    fingerprint = command_tree_fingerprint(bot.tree, guild=guild)
+    state = await asyncio.to_thread(load_command_sync_state)
+    if not force and state.get(scope) == fingerprint:
+        logger.info(f"Command tree unchanged, skipping {scope} sync")
+        return None
+    synced = await bot.tree.sync(guild=guild)
+    state[scope] = fingerprint
+    await asyncio.to_thread(save_command_sync_state, state)
+    logger.info(f"Synced {len(synced)} commands ({scope})")
+    return synced
+
+async def restore_ticket_channel(channel):
+    """Recover what a restart lost for one open ticket; REST calls only for gaps"""
+    async with startup_semaphore:
+        try:
+            await backfill_transcript_journal(channel)
+        except Exception as e:
+            logger.error(f"Error backfilling transcript journal for {channel.name}: {e}")
+
+def open_ticket_channel_name(record):
+    """Channel name the ticket was logged under when it opened"""
+    for entry in ticket_log_store.entries():
+        if entry.get("unique_id") == record.unique_id and entry.get("closed_at") is None:
+            return entry["channel_name"]
+    return record.renames[-1].new_name if record.renames else f"ticket-{record.channel_id}"
+
+async def channel_confirmed_deleted(channel_id):
+    """True only if Discord says the channel no longer exists"""
+    try:
+        await bot.fetch_channel(channel_id)
+    except NotFound:
+        return True
+    except HTTPException as e:
+        logger.warning(f"Could not confirm whether ticket channel {channel_id} was deleted: {e}")
+    return False
+
+async def finalize_deleted_ticket(record, guild):
+    """Close a ticket whose channel was deleted while the bot was offline, from its journal alone"""
+    channel_id = record.channel_id
+    try:
+        if await asyncio.to_thread(transcript_journal.is_complete, channel_id):
+            name = await asyncio.to_thread(open_ticket_channel_name, record)
+            await save_transcript(DeletedTicketChannel(record, name, guild), bot.user)
+    except Exception as e:
+        logger.error(f"Error finalizing deleted ticket {channel_id}: {e}")
+    finally:
+        await asyncio.to_thread(transcript_journal.discard, channel_id)
+        cleanup_ticket(channel_id)
+
 @bot.event
 async def on_ready():
     try:
@@ -786,22 +3341,23 @@ async def on_ready():
             activity=activity
         )
         
-        synced = await bot.tree.sync()
-        logger.info(f"Synced {len(synced)} commands")
-        
-        check_inactive_tickets.start()
-        
         guild = bot.get_guild(GUILD_ID)
         if guild:
-            for channel in guild.text_channels:
-                if channel.category and channel.category.id in [c["id"] for c in TICKET_CATEGORIES.values()]:
-                    view = TicketControls(None)
-                    async for message in channel.history(limit=50):
-                        if message.author == bot.user and message.components:
-                            view.message = message
-                            bot.add_view(view)
-                            break
+            channel_pool.adopt(guild)
+            ticket_channels = [channel for channel in guild.text_channels if is_ticket_channel(channel)]
+            if guild.unavailable:
+                # An outage leaves the guild without channels; that is not every ticket being deleted
+                logger.warning("Guild unavailable at startup, not checking for deleted tickets")
+            else:
+                for channel_id in [cid for cid in tickets if guild.get_channel(cid) is None]:
+                    if await channel_confirmed_deleted(channel_id):
+                        await finalize_deleted_ticket(tickets[channel_id], guild)
+            for channel in ticket_channels:
+                seed_ticket_activity(channel)
+            await asyncio.gather(*(restore_ticket_channel(channel) for channel in ticket_channels))
+            channel_pool.start()
         
+        inactivity_scheduler.start()
         logger.info("Ticket system initialized successfully!")
         
     except Exception as e:
@@ -876,47 +3432,235 @@ async def support(interaction: discord.Interaction):
 @bot.tree.command(name="rename-ticket", description="🔄 Rename current ticket")
 @app_commands.describe(new_name="New name for the ticket")
 async def rename_ticket(interaction: discord.Interaction, new_name: str):
-    if not interaction.channel.category or interaction.channel.category.id not in [c["id"] for c in TICKET_CATEGORIES.values()]:
+    if not is_ticket_channel(interaction.channel):
         return await interaction.response.send_message("❌ This command can only be used in ticket channels!", ephemeral=True)
     if CLAIM_ROLE_ID not in [role.id for role in interaction.user.roles]:
         return await interaction.response.send_message("🚫 Only staff members can rename tickets!", ephemeral=True)
     
     channel_id = interaction.channel.id
-    now = time.time()
-    if channel_id in rename_cooldowns:
-        remaining = rename_cooldowns[channel_id] - now
-        if remaining > 0:
-            return await interaction.response.send_message(
-                f"⏳ Please wait {int(remaining)} seconds before renaming again.",
-                ephemeral=True
-            )
-    
-    old_name = interaction.channel.name
-    ticket_info = ticket_data.get(channel_id, {})
-    unique_id = ticket_info.get("unique_id", generate_unique_ticket_id())
+    old_name = rename_scheduler.effective_name(interaction.channel)
+    record = tickets.get(channel_id)
+    unique_id = record.unique_id if record else generate_unique_ticket_id()
     
     try:
         ticket_number = old_name.split("-")[-1]
         if not ticket_number.isdigit():
-            ticket_number = get_next_ticket_number(ticket_info.get("category", "support"))
+            ticket_number = await reserve_ticket_number(record.category if record else "support")
         new_base_name = f"{new_name}-{ticket_number}"
         
-        await interaction.channel.edit(name=new_base_name)
-        rename_cooldowns[channel_id] = now + 60
+        delay = rename_scheduler.request(interaction.channel, new_base_name)
         
-        if channel_id not in ticket_renames:
-            ticket_renames[channel_id] = []
-        ticket_renames[channel_id].append(
-            (old_name, new_base_name, interaction.user.id, datetime.now(UTC))
-        )
+        ticket_state.rename(channel_id, old_name, new_base_name, interaction.user.id, datetime.now(UTC))
         
         await interaction.response.send_message(
-            f"✅ Ticket renamed from `{old_name}` to `{new_base_name}`\n"
+            f"✅ Ticket will be renamed from `{old_name}` to `{new_base_name}` {format_rename_delay(delay)}\n"
             f"🎫 Ticket ID: `{unique_id}`\n"
-            f"*You can use `/rename-ticket` again in 60 seconds*"
+            f"*Discord allows {RENAME_RATE_LIMIT} renames every {RENAME_RATE_WINDOW // 60} minutes; queued renames are merged into the latest name*"
         )
     except Exception as e:
         logger.error(f"Error renaming ticket: {e}")
         await interaction.response.send_message("❌ Failed to rename ticket.", ephemeral=True)
 
-bot.run(TOKEN)
+def format_seconds(value):
+    return str(timedelta(seconds=int(value))) if value is not None else "-"
+
+def format_stats_row(row):
+    tickets, duration, responded, first_response, staff_messages, claimed = row
+    average_response = format_seconds(first_response / responded) if responded else "-"
+    return (
+        f"**{tickets}** tickets • avg duration `{format_seconds(duration / tickets if tickets else None)}` • "
+        f"avg first response `{average_response}` ({responded}/{tickets} answered) • "
+        f"{claimed} claimed • {staff_messages} staff msgs"
+    )
+
+@bot.tree.command(name="ticket-stats", description="📊 Ticket analytics (Staff only)")
+@app_commands.describe(
+    days="Only tickets closed in the last N days (default: all time)",
+    category="Only this category",
+    language="Only this language",
+    export="Also write a columnar export of the ticket log for ad-hoc analysis"
+)
+@app_commands.choices(
+    category=[app_commands.Choice(name=name, value=name) for name in TICKET_CATEGORIES],
+    language=[app_commands.Choice(name="English", value="en"), app_commands.Choice(name="Italian", value="it")]
+)
+async def ticket_stats_command(
+    interaction: discord.Interaction,
+    days: Optional[app_commands.Range[int, 1, 3650]] = None,
+    category: Optional[str] = None,
+    language: Optional[str] = None,
+    export: bool = False
+):
+    if CLAIM_ROLE_ID not in [role.id for role in interaction.user.roles]:
+        return await interaction.response.send_message("🚫 Only staff members can view ticket stats!", ephemeral=True)
+
+    if export:
+        await interaction.response.defer(ephemeral=True)
+    stats = ticket_stats.query(days, category, language)
+    scope = " • ".join(filter(None, [
+        f"last {days} days" if days else "all time", category, {"en": "English", "it": "Italian"}.get(language)
+    ]))
+    embed = discord.Embed(
+        title="📊 Ticket Stats",
+        description=f"*{scope}*\n\n{format_stats_row(stats['totals'])}",
+        color=discord.Color.blurple(),
+        timestamp=datetime.now(UTC)
+    )
+    for name, rows in (("📂 By Category", stats["by_category"]), ("🌍 By Language", stats["by_language"])):
+        if rows:
+            value = "\n".join(
+                f"**{key}:** {format_stats_row(row)}"
+                for key, row in sorted(rows.items(), key=lambda item: item[1][0], reverse=True)
+            )
+            embed.add_field(name=name, value=value[:1024], inline=False)
+    if stats["staff"]:
+        top_staff = sorted(stats["staff"].items(), key=lambda item: (item[1][0], item[1][1]), reverse=True)[:10]
+        embed.add_field(
+            name="🛠️ Staff (claims • messages)",
+            value="\n".join(f"<@{user_id}>: {claims} • {messages}" for user_id, (claims, messages) in top_staff),
+            inline=False
+        )
+
+    if export:
+        try:
+            manifest = await asyncio.to_thread(lambda: export_ticket_columns(iter_ticket_log()))
+            embed.set_footer(text=f"Exported {manifest['rows']} tickets to {TICKET_COLUMNS_DIR}/")
+        except Exception as e:
+            logger.error(f"Error exporting ticket columns: {e}")
+            embed.set_footer(text="Columnar export failed, see logs")
+        await interaction.followup.send(embed=embed, ephemeral=True)
+    else:
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def backfill_transcript_index(history_limit=None):
+    """Index closed tickets from the log, pulling transcript text back from the transcript channel"""
+    indexed = await asyncio.to_thread(transcript_index.indexed)
+    pending = {
+        entry["channel_name"]: entry for entry in await asyncio.to_thread(load_full_ticket_log)
+        if entry.get("closed_at") and not indexed.get(transcript_index.key(entry))
+    }
+    with_content = 0
+    transcript_channel = bot.get_channel(TRANSCRIPT_CHANNEL_ID)
+    if transcript_channel and pending:
+        # Newest first, so a reused channel name picks up its latest transcript
+        async for message in transcript_channel.history(limit=history_limit):
+            if message.author != bot.user:
+                continue
+            parts = sorted(
+                (attachment for attachment in message.attachments if "_transcript.txt" in attachment.filename),
+                key=lambda attachment: attachment.filename
+            )
+            if not parts:
+                continue
+            entry = pending.pop(parts[0].filename.split("_transcript.txt")[0], None)
+            if entry is None:
+                continue
+            try:
+                data = b"".join([await attachment.read() for attachment in parts])
+                if ".txt.gz" in parts[0].filename:
+                    data = gzip.decompress(data)
+                await asyncio.to_thread(transcript_index.add, entry, data.decode("utf-8", errors="replace"))
+                with_content += 1
+            except Exception as e:
+                logger.error(f"Error indexing transcript {entry['channel_name']}: {e}")
+                pending[entry["channel_name"]] = entry
+            if not pending:
+                break
+    missing = [(entry, None) for entry in pending.values() if transcript_index.key(entry) not in indexed]
+    await asyncio.to_thread(transcript_index.add_many, missing)
+    metadata_only = len(missing)
+    logger.info(f"Transcript index backfill: {with_content} transcripts, {metadata_only} metadata only")
+    return with_content, metadata_only
+
+@bot.tree.command(name="ticket-search", description="🔎 Search closed ticket transcripts (Staff only)")
+@app_commands.describe(query="Words, a user name or ID, a ticket ID or a channel name")
+async def ticket_search(interaction: discord.Interaction, query: str):
+    if CLAIM_ROLE_ID not in [role.id for role in interaction.user.roles]:
+        return await interaction.response.send_message("🚫 Only staff members can search tickets!", ephemeral=True)
+    start = time.perf_counter()
+    try:
+        hits = await asyncio.to_thread(transcript_index.search, query)
+    except sqlite3.Error as e:
+        logger.error(f"Error searching transcripts: {e}")
+        return await interaction.response.send_message("❌ Search failed. Please try again.", ephemeral=True)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    embed = discord.Embed(title=f"🔎 Results for \"{query[:200]}\"", color=discord.Color.blurple())
+    if not hits:
+        embed.description = "No matching tickets."
+    for unique_id, channel_name, category, closed_at, snippet in hits:
+        closed = format_log_time(closed_at) if closed_at else "unknown"
+        embed.add_field(
+            name=f"{channel_name} • `{unique_id}` • {closed}"[:256],
+            value=(snippet.replace("\n", " ") if snippet else f"*{category}, transcript not indexed*")[:1024],
+            inline=False
+        )
+    embed.set_footer(text=f"{len(hits)} results in {elapsed:.1f} ms")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="ticket-index-backfill", description="🗂️ Index past transcripts for /ticket-search (Admin only)")
+@app_commands.describe(history_limit="How many transcript channel messages to scan (default: all)")
+@app_commands.default_permissions(administrator=True)
+async def ticket_index_backfill(interaction: discord.Interaction, history_limit: Optional[app_commands.Range[int, 1, 1000000]] = None):
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("🚫 Only administrators can backfill the search index!", ephemeral=True)
+    await interaction.response.defer(ephemeral=True)
+    try:
+        with_content, metadata_only = await backfill_transcript_index(history_limit)
+        message = f"✅ Indexed {with_content} transcripts and {metadata_only} tickets without a transcript."
+    except Exception as e:
+        logger.error(f"Error backfilling transcript index: {e}")
+        message = "❌ Backfill failed, see logs."
+    try:
+        await interaction.followup.send(message, ephemeral=True)
+    except HTTPException:
+        # Long backfills can outlive the interaction token
+        await interaction.user.send(message)
+
+@bot.tree.command(name="profile", description="🩺 Profile the bot for a while (Admin only)")
+@app_commands.describe(
+    seconds="How long to profile for (also the limit when counting interactions)",
+    interactions="Stop after this many interactions instead",
+    mode="cProfile is exact but slows the bot down; sampling is lighter"
+)
+@app_commands.choices(mode=[
+    app_commands.Choice(name="cProfile", value="cprofile"),
+    app_commands.Choice(name="Sampling", value="sampling")
+])
+@app_commands.default_permissions(administrator=True)
+async def profile(
+    interaction: discord.Interaction,
+    seconds: app_commands.Range[int, 1, PROFILE_MAX_SECONDS] = 30,
+    interactions: Optional[app_commands.Range[int, 1, 10000]] = None,
+    mode: str = "cprofile"
+):
+    global profiling_session
+    if not interaction.user.guild_permissions.administrator:
+        return await interaction.response.send_message("🚫 Only administrators can profile the bot!", ephemeral=True)
+    if profiling_session is not None:
+        return await interaction.response.send_message("⏳ A profiling session is already running.", ephemeral=True)
+
+    session = ProfilingSession(mode, seconds, interactions, origin_id=interaction.id)
+    profiling_session = session
+    metrics.add_listener(session.record)
+    try:
+        session.start()
+        limit = f"{interactions} interactions or {seconds}s" if interactions else f"{seconds}s"
+        await interaction.response.send_message(f"🩺 Profiling ({mode}) for {limit}...", ephemeral=True)
+        await session.done.wait()
+    finally:
+        session.finish()
+        metrics.remove_listener(session.record)
+        profiling_session = None
+
+    try:
+        channel = bot.get_channel(PROFILE_CHANNEL_ID) or interaction.channel
+        await channel.send(
+            f"🩺 Profile requested by {interaction.user.mention}: {session.elapsed:.1f}s, {session.interactions} interactions",
+            files=session.files()
+        )
+    except Exception as e:
+        logger.error(f"Error sending profiling report: {e}")
+
+if __name__ == "__main__":
+    bot.run(TOKEN)